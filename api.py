@@ -1,8 +1,17 @@
-from fastapi import FastAPI, HTTPException
+import os
+import threading
+from fastapi import FastAPI, HTTPException, Header, Response
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 # 👇 THIS is the correct import now
 from scripts.final_agent import initialize_agent_system
+from scripts.delay_predictions import lookup_prediction
+from scripts.query_encoder import query_encoder_metrics
+from scripts.function_agent import agent_stats_summary
+from scripts.context_builder import context_stats
+from scripts.tracing import TRACE_HEADER, start_trace, get_trace, render_metrics, set_process_metrics, flush_metrics
+from scripts.preload import PRELOAD, preload_artifacts, worker_memory
 
 # Define the request format
 class ChatRequest(BaseModel):
@@ -19,21 +28,107 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize the agent once when the server starts
-print("🤖 Initializing Railway AI Agent...")
-agent = initialize_agent_system()
+# The agent holds the Gemini clients (HTTP/gRPC connections), which must not be inherited
+# through fork(), so it is built once per process: in each gunicorn worker (post_fork),
+# or at startup when the app runs on its own
+_agent = None
+_agent_pid = None
+_agent_lock = threading.Lock()
 
+def get_agent():
+    global _agent, _agent_pid
+    if _agent_pid != os.getpid():
+        with _agent_lock:
+            if _agent_pid != os.getpid():
+                print(f"🤖 Initializing Railway AI Agent (pid {os.getpid()})...")
+                _agent = initialize_agent_system()
+                _agent_pid = os.getpid()
+    return _agent
+
+# Under gunicorn (gunicorn.conf.py) this runs once in the master, before the workers fork:
+# only the read-only retrieval artifacts, never the agent
+if PRELOAD:
+    print(f"📦 Preloaded read-only artifacts: {preload_artifacts()}")
+else:
+    get_agent()
+
+# Plain def: FastAPI runs it in its threadpool, so requests (and their query embeddings)
+# overlap instead of queueing on the event loop
 @app.post("/chat")
-async def chat(request: ChatRequest):
+def chat(request: ChatRequest, http_response: Response, x_trace_id: str | None = Header(default=None)):
     try:
-        # Ask the agent
-        response = agent.invoke(request.message)
+        # Ask the agent (traced end to end when RAILWAY_TRACING=1; a caller's X-Trace-Id is reused)
+        with start_trace(x_trace_id) as trace:
+            response = get_agent().invoke(request.message)
+        if getattr(trace, "trace_id", None):
+            http_response.headers[TRACE_HEADER] = trace.trace_id
         # Handle different response types from LangChain
         output_text = response.get("output") if isinstance(response, dict) else str(response)
+        print(f"⏱️ {response.get('mode')}: {response.get('llm_calls')} LLM calls, {response.get('wall_ms')} ms")
         return {"response": output_text}
     except Exception as e:
         print(f"❌ Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Lets whichever worker gets the next /metrics scrape include this request
+        flush_metrics()
+
+@app.get("/predictions/{train_no}/{station_code}")
+def predicted_delay(train_no: str, station_code: str, date: str | None = None):
+    # Precomputed by scripts/delay_predictions.py -> one indexed lookup, no model call
+    delay = lookup_prediction(train_no, station_code, date)
+    if delay is None:
+        raise HTTPException(status_code=404, detail="No prediction for that train/station/date.")
+    return {"train_no": train_no, "station_code": station_code.upper(), "predicted_delay": delay}
+
+@app.get("/metrics/embedding")
+def embedding_metrics():
+    # Per-query embedding latency, cache hit rate and batch sizes of the CPU query encoder
+    return {"query_encoder": query_encoder_metrics()}
+
+@app.get("/metrics/agent")
+def agent_metrics():
+    # LLM calls and wall time per request, per agent mode (AGENT_MODE=react / function_calling)
+    return agent_stats_summary()
+
+def process_metrics():
+    # This worker's own stats; published with its span metrics so any worker can serve the totals
+    encoder = query_encoder_metrics() or {}
+    return {
+        "railway_context_tokens_sent_total": ("counter", "Rules context tokens sent to the LLM", context_stats["sent_tokens"]),
+        "railway_context_tokens_baseline_total": ("counter", "Tokens the old top-k context would have sent", context_stats["baseline_tokens"]),
+        "railway_embedding_cache_hits_total": ("counter", "Query encoder LRU cache hits", encoder.get("cache_hits")),
+        "railway_embedding_cache_misses_total": ("counter", "Query encoder LRU cache misses", encoder.get("cache_misses")),
+        "railway_embedding_avg_batch_size": ("gauge", "Average query encoder batch size", encoder.get("avg_batch_size")),
+    }
+
+set_process_metrics(process_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    # Span histograms + LLM token counters (RAILWAY_TRACING=1) and the in-process stats, summed over
+    # all gunicorn workers (RAILWAY_METRICS_DIR); gauges are labelled with the process's pid
+    report = worker_memory()
+    processes = [p for p in [report.get("master")] + report["workers"] if p]
+    text = render_metrics({
+        "railway_worker_rss_mb": ("gauge", "Resident memory per process", {p["pid"]: p.get("rss_mb") for p in processes}),
+        "railway_worker_pss_mb": ("gauge", "Proportional set size per process (shared pages split)", {p["pid"]: p.get("pss_mb") for p in processes}),
+        "railway_worker_uss_mb": ("gauge", "Memory private to each process", {p["pid"]: p.get("uss_mb") for p in processes}),
+    })
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/memory")
+def memory_metrics():
+    # Rss/Pss/Uss of the gunicorn master and every worker (how many more workers fit on the node)
+    return worker_memory()
+
+@app.get("/traces/{trace_id}")
+def trace_detail(trace_id: str):
+    # Span breakdown of a recent /chat request (the X-Trace-Id response header), from any worker
+    trace = get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found (tracing off or too old).")
+    return trace
 
 @app.get("/")
 def home():
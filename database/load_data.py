@@ -2,6 +2,10 @@ import pandas as pd
 from sqlalchemy.orm import sessionmaker
 from models import Station, TrainSchedule, engine
 import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.profiling import Profiler
 
 # Create a Session to talk to the DB
 Session = sessionmaker(bind=engine)
@@ -30,6 +34,7 @@ def load_stations():
         session.bulk_save_objects(stations_data)
         session.commit()
         print(f"   ✅ Inserted {len(stations_data)} stations.")
+        return len(stations_data)
     except Exception as e:
         session.rollback()
         print(f"   ❌ Error loading stations: {e}")
@@ -88,14 +93,22 @@ def load_schedules():
             
     session.close()
     print("   ✅ All Schedules loaded.")
+    return total_rows
 
     
 if __name__ == "__main__":
+    # PROFILE=1 (or --profile) writes per-stage timings to docs/profiles/
+    profiler = Profiler("load_data")
+
     # 1. Create Tables first
     from models import create_tables
-    create_tables()
+    with profiler.stage("create_tables"):
+        create_tables()
     
     # 2. Load Data
-    load_stations()
-    load_schedules()
+    with profiler.stage("load_stations") as st:
+        st.rows = load_stations()
+    with profiler.stage("load_schedules") as st:
+        st.rows = load_schedules()
+    profiler.report()
     print("\n🎉 PHASE 3 COMPLETE: Database is live!")
\ No newline at end of file
@@ -33,6 +33,29 @@ class TrainSchedule(Base):
     # Relationship: Link back to the Station table
     station = relationship("Station", back_populates="schedules")
 
+class DelayPrediction(Base):
+    __tablename__ = 'delay_predictions'
+
+    # Composite primary key = the index the API/agent look predictions up with
+    train_no = Column(String, primary_key=True)
+    station_code = Column(String, primary_key=True)
+    date = Column(String, primary_key=True)  # 'YYYY-MM-DD'
+    predicted_delay = Column(Float)
+    # Used by scripts/delay_predictions.py to only recompute rows that changed
+    input_hash = Column(String)
+    model_version = Column(String)
+
+class DelayForecast(Base):
+    __tablename__ = 'delay_forecasts'
+
+    # One row per series per forecast day, e.g. ('zone', 'NR', '2026-01-05')
+    level = Column(String, primary_key=True)  # 'system', 'zone', 'station' or 'zone_other' (a zone's pooled quieter stations)
+    series = Column(String, primary_key=True)
+    date = Column(String, primary_key=True)
+    base_forecast = Column(Float)  # Holt-Winters output for this series alone
+    forecast = Column(Float)       # Reconciled: stations add up to zones, zones to system
+    created_at = Column(String)
+
 # --- DATABASE CONNECTION ---
 # For now, we use SQLite (creates a file 'railways.db'). 
 # Later, we swap this string to connect to AWS/Postgres.
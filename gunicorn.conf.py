@@ -0,0 +1,54 @@
+# Multi-worker API with preloaded, read-only artifacts:
+#   gunicorn api:app -c gunicorn.conf.py
+# The master imports api.py and loads the BM25 index, vector store and query encoder once,
+# then forks the workers. What stays shared is the array data: the mmapped .npy files (page
+# cache) and the encoder's tensor storage. Python objects (BM25 texts/metadata, the term dict)
+# are un-shared page by page as the workers' refcount updates write to them.
+# The agent and its Gemini clients are built in each worker (post_fork), never in the master.
+import os
+import gc
+import shutil
+import tempfile
+
+# --- CONFIGURATION ---
+bind = os.getenv("API_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120  # Agent requests wait on Gemini
+
+# Read by api.py / preload.py when the master imports the app
+os.environ.setdefault("RAILWAY_PRELOAD", "1")
+os.environ.setdefault("RAG_VECTOR_BACKEND", "compact")  # mmap'd, fork-safe (Chroma is not)
+os.environ.setdefault("EMBED_SERVING", "cpu")
+# Split the cores between workers instead of every worker's torch using all of them
+os.environ.setdefault("EMBED_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+# Each worker publishes its metrics and traces here, so /metrics sums all workers (counters
+# never jump backwards between scrapes) and /traces/<id> works from any worker
+os.environ.setdefault("RAILWAY_METRICS_DIR", os.path.join(tempfile.gettempdir(), "railway_metrics"))
+
+
+def on_starting(server):
+    # Inherited by every worker, so /metrics/memory can list its siblings
+    os.environ["RAILWAY_MASTER_PID"] = str(os.getpid())
+    # Counters restart from zero with the service, like prometheus_client's multiprocess dir
+    shutil.rmtree(os.environ["RAILWAY_METRICS_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["RAILWAY_METRICS_DIR"], exist_ok=True)
+
+
+def when_ready(server):
+    from scripts.preload import memory_report
+    master = memory_report()
+    server.log.info(f"Master ready: RSS {master.get('rss_mb')} MB, PSS {master.get('pss_mb')} MB")
+
+
+def pre_fork(server, worker):
+    # Anything the master allocated since preload is frozen too (no GC writes to shared pages)
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} forked")
+    # Own Gemini clients per worker; built here so the first request doesn't pay for it
+    from api import get_agent
+    get_agent()
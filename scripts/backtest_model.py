@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+import joblib
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+# Allow "python scripts/backtest_model.py" as well as "python -m scripts.backtest_model"
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.delay_features import DATA_PATH, build_feature_matrix, load_feature_matrix
+
+# --- CONFIGURATION ---
+MODEL_PATH = "models/delay_model.pkl"
+REPORT_PATH = "docs/model_evaluation.json"  # Lives next to docs/model_evaluation.png
+
+N_FOLDS = 5            # How many rolling origins to test
+HORIZON_DAYS = 7       # Each fold predicts the next week
+MIN_TRAIN_DAYS = 30    # Never train on less than a month of history
+LATENCY_ROWS = 10_000  # Predict latency is reported per 10k rows
+MAX_WORKERS = int(os.getenv("BACKTEST_WORKERS", os.cpu_count() or 1))
+
+
+def make_folds(days, n_folds=N_FOLDS, horizon=HORIZON_DAYS, min_train=MIN_TRAIN_DAYS):
+    """
+    Rolling-origin splits by Date: train on every day BEFORE the origin, test on the
+    next `horizon` days. The origin moves forward one horizon per fold, so no fold
+    ever sees the future.
+    """
+    unique_days = np.unique(days)
+    # Use as many folds as the history allows (keeping the minimum training window)
+    max_folds = (len(unique_days) - min_train) // horizon
+    n_folds = min(n_folds, max_folds)
+
+    folds = []
+    first_test = len(unique_days) - n_folds * horizon
+    for i in range(n_folds):
+        start = first_test + i * horizon
+        folds.append({
+            "fold": i + 1,
+            "test_start": int(unique_days[start]),
+            "test_end": int(unique_days[start + horizon - 1]),
+        })
+    return folds
+
+
+def _metrics(y_true, y_pred):
+    rmse = float(np.sqrt(mean_squared_error(y_true, y_pred)))
+    return {
+        "rows": int(len(y_true)),
+        "mae": float(mean_absolute_error(y_true, y_pred)),
+        "rmse": rmse,
+        # R2 is undefined for a single row
+        "r2": float(r2_score(y_true, y_pred)) if len(y_true) > 1 else None,
+    }
+
+
+def predict_latency(model, X, rows=LATENCY_ROWS, repeats=3):
+    """Best-of-N wall time (ms) to predict `rows` rows."""
+    idx = np.arange(rows) % len(X)
+    batch = np.ascontiguousarray(X[idx])
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        model.predict(batch)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def _day_str(day):
+    return str(np.datetime64(int(day), 'D'))
+
+
+def run_fold(cache_folder, fold):
+    """Runs in a worker process. Reads the shared (memory-mapped) feature matrix."""
+    data = load_feature_matrix(cache_folder)
+    X, y, days, zones = data["X"], data["y"], data["days"], data["zones"]
+    zone_names = data["meta"]["zones"]
+
+    train_mask = days < fold["test_start"]
+    test_mask = (days >= fold["test_start"]) & (days <= fold["test_end"])
+
+    t0 = time.perf_counter()
+    # Same hyper-parameters as train_model.py; one core per fold since folds run in parallel
+    model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=1)
+    model.fit(X[train_mask], y[train_mask])
+    fit_seconds = time.perf_counter() - t0
+
+    X_test, y_test = X[test_mask], y[test_mask]
+    y_pred = model.predict(X_test)
+
+    per_zone = {}
+    test_zones = zones[test_mask]
+    for code in np.unique(test_zones):
+        in_zone = test_zones == code
+        per_zone[zone_names[code]] = _metrics(y_test[in_zone], y_pred[in_zone])
+
+    return {
+        "fold": fold["fold"],
+        "train_until": _day_str(fold["test_start"] - 1),
+        "test_from": _day_str(fold["test_start"]),
+        "test_to": _day_str(fold["test_end"]),
+        "train_rows": int(train_mask.sum()),
+        "fit_seconds": round(fit_seconds, 3),
+        "predict_ms_per_10k": round(predict_latency(model, X_test), 2),
+        "overall": _metrics(y_test, y_pred),
+        "per_zone": per_zone,
+    }
+
+
+def _summarise(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {"mean": float(np.mean(values)), "std": float(np.std(values))}
+
+
+def backtest():
+    print("1. Preparing Feature Cache...")
+    if not os.path.exists(DATA_PATH):
+        print("❌ Error: History file not found. Run generating_training_data.py first.")
+        return
+
+    cache_folder = build_feature_matrix(DATA_PATH)
+    data = load_feature_matrix(cache_folder)
+
+    folds = make_folds(data["days"])
+    if not folds:
+        print(f"❌ Error: Need more than {MIN_TRAIN_DAYS + HORIZON_DAYS} days of history to backtest.")
+        return
+
+    print(f"2. Running {len(folds)} rolling-origin folds on {min(MAX_WORKERS, len(folds))} processes...")
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=min(MAX_WORKERS, len(folds))) as pool:
+        results = list(pool.map(run_fold, [cache_folder] * len(folds), folds))
+    wall_seconds = time.perf_counter() - t0
+
+    for r in results:
+        m = r["overall"]
+        r2 = "n/a" if m["r2"] is None else f"{m['r2']:.2f}"
+        print(f"   Fold {r['fold']} ({r['test_from']} → {r['test_to']}): "
+              f"MAE {m['mae']:.2f} | RMSE {m['rmse']:.2f} | R2 {r2}")
+
+    report = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "data": data["meta"]["source"],
+        "rows": data["meta"]["rows"],
+        "features": data["meta"]["features"],
+        "n_folds": len(folds),
+        "horizon_days": HORIZON_DAYS,
+        "wall_seconds": round(wall_seconds, 2),
+        "summary": {
+            "mae": _summarise([r["overall"]["mae"] for r in results]),
+            "rmse": _summarise([r["overall"]["rmse"] for r in results]),
+            "r2": _summarise([r["overall"]["r2"] for r in results]),
+            "predict_ms_per_10k": _summarise([r["predict_ms_per_10k"] for r in results]),
+        },
+        "folds": results,
+    }
+
+    # Latency of the model that is actually deployed (if it has been trained)
+    if os.path.exists(MODEL_PATH):
+        print("3. Timing the deployed model...")
+        model = joblib.load(MODEL_PATH)
+        report["deployed_model_predict_ms_per_10k"] = round(predict_latency(model, data["X"]), 2)
+
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+    with open(REPORT_PATH, "w") as f:
+        json.dump(report, f, indent=2)
+
+    s = report["summary"]
+    print("\n📊 BACKTEST REPORT CARD")
+    print("-" * 30)
+    print(f"   MAE:  {s['mae']['mean']:.2f} ± {s['mae']['std']:.2f} min")
+    print(f"   RMSE: {s['rmse']['mean']:.2f} ± {s['rmse']['std']:.2f} min")
+    if s['r2']:
+        print(f"   R2:   {s['r2']['mean']:.2f} ± {s['r2']['std']:.2f}")
+    print(f"   Predict latency: {s['predict_ms_per_10k']['mean']:.1f} ms / 10k rows")
+    print("-" * 30)
+    print(f"   ✅ Report saved to {REPORT_PATH}")
+
+
+if __name__ == "__main__":
+    backtest()
@@ -0,0 +1,100 @@
+import os
+import sys
+import json
+import time
+import multiprocessing as mp
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# --- CONFIGURATION ---
+CHROMA_PATH = "chroma_db"
+COMPACT_DIR = "chroma_db/compact"
+REPORT_PATH = "docs/vector_store_benchmark.json"
+N_QUERIES = 200
+K = 3
+
+
+def rss_mb():
+    """Current resident set size of this process (Linux), in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Peak, on non-Linux
+
+
+def _bench(backend, queries, result):
+    """Runs in a fresh process so load time and memory are measured cold."""
+    base_rss = rss_mb()
+    t0 = time.perf_counter()
+    if backend == "chroma":
+        from langchain_community.vectorstores import Chroma
+        store = Chroma(persist_directory=CHROMA_PATH)
+        store.similarity_search_by_vector(queries[0].tolist(), k=K)  # Chroma loads the HNSW index lazily
+        search = lambda q: store.similarity_search_by_vector(q.tolist(), k=K)
+    else:
+        from scripts.compact_store import CompactVectorStore
+        store = CompactVectorStore(COMPACT_DIR)
+        store.similarity_search_by_vector(queries[0], k=K)
+        search = lambda q: store.similarity_search_by_vector(q, k=K)
+    load_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    for q in queries:
+        search(q)
+    single_qps = len(queries) / (time.perf_counter() - t0)
+
+    out = {
+        "cold_load_ms": round(load_ms, 1),
+        "rss_mb": round(rss_mb() - base_rss, 1),
+        "queries_per_sec": round(single_qps, 1),
+    }
+    if backend == "compact":
+        # The compact store can also score a whole batch in one matrix product
+        t0 = time.perf_counter()
+        store.search_by_vectors(queries, k=K)
+        out["batched_queries_per_sec"] = round(len(queries) / (time.perf_counter() - t0), 1)
+    result.update(out)
+
+
+def benchmark():
+    print("1. Sampling query vectors...")
+    if not os.path.exists(COMPACT_DIR):
+        print("❌ Error: Compact store not found. Run build_rag_db.py first.")
+        return
+    # Real stored vectors + noise: realistic queries without loading the embedding model
+    stored = np.load(os.path.join(COMPACT_DIR, "vectors.npy"))
+    vectors = stored.astype(np.float32)
+    if os.path.exists(os.path.join(COMPACT_DIR, "scales.npy")):
+        vectors *= np.load(os.path.join(COMPACT_DIR, "scales.npy"))[:, None]  # int8 -> float
+    rng = np.random.default_rng(42)
+    queries = vectors[rng.integers(0, len(vectors), N_QUERIES)] + rng.normal(0, 0.02, (N_QUERIES, vectors.shape[1]))
+    queries = queries.astype(np.float32)
+
+    report = {"vectors": int(len(vectors)), "dim": int(vectors.shape[1]),
+              "dtype": str(stored.dtype), "queries": N_QUERIES, "k": K, "backends": {}}
+
+    ctx = mp.get_context("spawn")
+    with ctx.Manager() as manager:
+        for backend in ("chroma", "compact"):
+            print(f"2. Benchmarking {backend}...")
+            result = manager.dict()
+            proc = ctx.Process(target=_bench, args=(backend, queries, result))
+            proc.start()
+            proc.join()
+            report["backends"][backend] = dict(result)
+            print(f"   {backend:<8} {dict(result)}")
+
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+    with open(REPORT_PATH, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"   ✅ Report saved to {REPORT_PATH}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,141 @@
+import os
+import re
+import json
+import math
+from collections import Counter
+import numpy as np
+from langchain_core.documents import Document
+
+# --- CONFIGURATION ---
+INDEX_PATH = "chroma_db/bm25_index.json"  # Persisted next to the vector DB it mirrors
+ARRAYS_DIR = "chroma_db/bm25_arrays"        # Same postings as flat .npy files, for memory-mapping
+K1 = 1.5
+B = 0.75
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "of", "to", "in", "on", "for", "and", "or",
+    "what", "how", "when", "can", "i", "my", "me", "do", "does", "if", "be", "with",
+    "it", "at", "by", "as", "from", "this", "that", "there", "any", "about",
+}
+
+
+def tokenize(text):
+    """Lowercase word/number tokens without stopwords ('TDR', 'tatkal', '24' all survive)."""
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Small in-memory inverted index (Okapi BM25) over the same chunks that are in Chroma.
+    It also keeps the chunk text + metadata, so lexical search never touches Chroma or
+    the embedding model.
+    """
+
+    def __init__(self, ids, texts, metadatas, postings, doc_len, k1=K1, b=B):
+        self.ids = list(ids)
+        self.texts = list(texts)
+        self.metadatas = list(metadatas)
+        self.doc_len = np.asarray(doc_len, dtype=float)
+        self.avg_len = float(self.doc_len.mean()) if len(self.doc_len) else 0.0
+        self.k1, self.b = k1, b
+        # term -> (chunk positions, term frequencies)
+        self.postings = {t: (np.asarray(p[0], dtype=np.int32), np.asarray(p[1], dtype=float))
+                         for t, p in postings.items()}
+
+    @classmethod
+    def build(cls, ids, texts, metadatas):
+        postings, doc_len = {}, []
+        for pos, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                entry = postings.setdefault(term, ([], []))
+                entry[0].append(pos)
+                entry[1].append(tf)
+        return cls(ids, texts, [m or {} for m in metadatas], postings, doc_len)
+
+    def idf(self, term):
+        n = len(self.postings[term][0]) if term in self.postings else 0
+        return math.log(1 + (len(self.ids) - n + 0.5) / (n + 0.5))
+
+    def search(self, query, k=3):
+        """Returns [(position, score), ...] for the top-k chunks."""
+        scores = np.zeros(len(self.ids))
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len / max(self.avg_len, 1e-9))
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            docs, tf = self.postings[term]
+            scores[docs] += self.idf(term) * tf * (self.k1 + 1) / (tf + norm[docs])
+
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k)[:k]]
+        hits = hits[np.argsort(-scores[hits])]
+        return [(int(i), float(scores[i])) for i in hits]
+
+    def search_documents(self, query, k=3):
+        return [Document(page_content=self.texts[i], metadata=self.metadatas[i]) for i, _ in self.search(query, k)]
+
+    def save(self, path=INDEX_PATH, arrays_dir=ARRAYS_DIR):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "k1": self.k1, "b": self.b,
+                "ids": self.ids, "texts": self.texts, "metadatas": self.metadatas,
+                "doc_len": self.doc_len.astype(int).tolist(),
+                "postings": {t: [p[0].tolist(), p[1].astype(int).tolist()] for t, p in self.postings.items()},
+            }, f)
+        if arrays_dir:
+            self.save_arrays(arrays_dir)
+
+    def save_arrays(self, folder=ARRAYS_DIR):
+        """
+        Postings as CSR arrays (docs.npy / tf.npy sliced by offsets.npy). Loaded with
+        mmap these are shared through the page cache by every API worker process; the
+        texts/metadata in meta.json are still loaded as Python objects, one copy per worker.
+        """
+        os.makedirs(folder, exist_ok=True)
+        terms = sorted(self.postings)
+        lengths = [len(self.postings[t][0]) for t in terms]
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        empty_i, empty_f = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=float)
+        np.save(os.path.join(folder, "offsets.npy"), offsets)
+        np.save(os.path.join(folder, "docs.npy"),
+                np.concatenate([self.postings[t][0] for t in terms] or [empty_i]).astype(np.int32))
+        np.save(os.path.join(folder, "tf.npy"),
+                np.concatenate([self.postings[t][1] for t in terms] or [empty_f]).astype(float))
+        np.save(os.path.join(folder, "doc_len.npy"), self.doc_len)
+        with open(os.path.join(folder, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "terms": terms,
+                       "ids": self.ids, "texts": self.texts, "metadatas": self.metadatas}, f)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["ids"], data["texts"], data["metadatas"], data["postings"], data["doc_len"],
+                   k1=data["k1"], b=data["b"])
+
+    @classmethod
+    def load_arrays(cls, folder=ARRAYS_DIR, mmap=True):
+        """Loads save_arrays() output; each term's postings are views into the mapped files."""
+        mode = 'r' if mmap else None
+        offsets = np.load(os.path.join(folder, "offsets.npy"))
+        docs = np.load(os.path.join(folder, "docs.npy"), mmap_mode=mode)
+        tf = np.load(os.path.join(folder, "tf.npy"), mmap_mode=mode)
+        doc_len = np.load(os.path.join(folder, "doc_len.npy"), mmap_mode=mode)
+        with open(os.path.join(folder, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        postings = {t: (docs[offsets[i]:offsets[i + 1]], tf[offsets[i]:offsets[i + 1]])
+                    for i, t in enumerate(meta["terms"])}
+        return cls(meta["ids"], meta["texts"], meta["metadatas"], postings, doc_len, k1=meta["k1"], b=meta["b"])
+
+
+def build_from_chroma(vector_db, path=INDEX_PATH):
+    """Rebuilds the BM25 index from exactly the chunks stored in Chroma."""
+    stored = vector_db.get(include=["documents", "metadatas"])
+    index = BM25Index.build(stored["ids"], stored["documents"], stored["metadatas"])
+    index.save(path)
+    return index
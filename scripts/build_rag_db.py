@@ -1,60 +1,206 @@
 import os
-import torch  # We import torch to check for CUDA
+import sys
+import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.embedding_cache import load_embeddings
+from scripts.bm25_index import INDEX_PATH as BM25_PATH, build_from_chroma
+from scripts.compact_store import COMPACT_DIR, export_from_chroma
+
 load_dotenv()
 
 PDF_DIR = "data/reference_docs"
 DB_DIR = "chroma_db"
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+PARSE_WORKERS = int(os.getenv("PDF_WORKERS", os.cpu_count() or 1))
+# Remembers what is already in the DB: file hash -> page hashes -> chunk IDs
+MANIFEST_PATH = os.path.join(DB_DIR, "index_manifest.json")
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_ids(file_name, page, chunks):
+    """
+    Content-addressed IDs: the same chunk text on the same page always gets the same ID,
+    so unchanged chunks are never re-embedded and re-running never duplicates them.
+    """
+    ids, seen = [], {}
+    for chunk in chunks:
+        base = hashlib.sha1(f"{file_name}|{page}|{chunk.page_content}".encode("utf-8")).hexdigest()[:24]
+        # Identical text twice on one page still needs two IDs
+        n = seen.get(base, 0)
+        seen[base] = n + 1
+        ids.append(base if n == 0 else f"{base}-{n}")
+    return ids
+
+
+def load_manifest():
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    return {"files": {}}
+
+
+def save_manifest(manifest):
+    os.makedirs(DB_DIR, exist_ok=True)
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def parse_pdf(path, file, old_page_hashes):
+    """
+    Runs in a worker process: loads one PDF and splits only the pages whose text changed.
+    Returns (file, [(page, page_hash, chunks or None if unchanged), ...]).
+    """
+    # start_index lets the context builder stitch overlapping/adjacent chunks back together
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+                                                   add_start_index=True)
+    pages = []
+    for doc in PyPDFLoader(path).load():
+        page = str(doc.metadata.get("page", 0))
+        page_digest = text_hash(doc.page_content)
+        unchanged = old_page_hashes.get(page) == page_digest
+        pages.append((page, page_digest, None if unchanged else text_splitter.split_documents([doc])))
+    return file, pages
+
 
 def build_vector_db():
     print("1. Checking for PDFs...")
-    if not os.path.exists(PDF_DIR) or not os.listdir(PDF_DIR):
+    manifest = load_manifest()
+    pdfs = sorted(f for f in os.listdir(PDF_DIR) if f.endswith(".pdf")) if os.path.exists(PDF_DIR) else []
+    # With an existing index, an empty folder means every PDF was removed: fall through so
+    # their chunks are deleted from Chroma, BM25, the compact store and the manifest
+    if not pdfs and not manifest["files"]:
         print(f"❌ Error: No PDFs found in {PDF_DIR}.")
         return
 
-    documents = []
-    for file in os.listdir(PDF_DIR):
-        if file.endswith(".pdf"):
+    to_delete, to_add, add_ids = [], [], []
+    new_manifest = {"files": {}}
+
+    print("2. Diffing against the existing index...")
+    changed = {}
+    for file in pdfs:
+        digest = file_hash(os.path.join(PDF_DIR, file))
+        old = manifest["files"].get(file)
+        if old and old["sha256"] == digest:
+            new_manifest["files"][file] = old  # Untouched file: nothing to load or embed
+        else:
             print(f"   📖 Loading: {file}")
-            loader = PyPDFLoader(os.path.join(PDF_DIR, file))
-            documents.extend(loader.load())
+            changed[file] = digest
+
+    # Parse + split the changed PDFs in parallel
+    parsed = []
+    if changed:
+        t0 = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=min(PARSE_WORKERS, len(changed))) as pool:
+            parsed = list(pool.map(
+                parse_pdf,
+                [os.path.join(PDF_DIR, f) for f in changed],
+                list(changed),
+                [{p: info["hash"] for p, info in manifest["files"].get(f, {}).get("pages", {}).items()} for f in changed],
+            ))
+        parse_seconds = time.perf_counter() - t0
+        n_pages = sum(len(pages) for _, pages in parsed)
+        print(f"   ⏱️ Parsed {n_pages} pages from {len(parsed)} PDFs in {parse_seconds:.1f}s "
+              f"({n_pages / max(parse_seconds, 1e-9):.1f} pages/sec)")
+
+    for file, parsed_pages in parsed:
+        digest = changed[file]
+        old = manifest["files"].get(file)
+        old_pages = old["pages"] if old else {}
+        pages = {}
+        for page, page_digest, chunks in parsed_pages:
+            if chunks is None:
+                pages[page] = old_pages[page]
+                continue
+
+            ids = chunk_ids(file, page, chunks)
+            old_ids = set(old_pages.get(page, {}).get("ids", []))
+
+            to_delete.extend(old_ids - set(ids))
+            for chunk, chunk_id in zip(chunks, ids):
+                if chunk_id not in old_ids:
+                    to_add.append(chunk)
+                    add_ids.append(chunk_id)
+            pages[page] = {"hash": page_digest, "ids": ids}
+
+        # Pages that disappeared from a changed file
+        for page, info in old_pages.items():
+            if page not in pages:
+                to_delete.extend(info["ids"])
+
+        new_manifest["files"][file] = {"sha256": digest, "pages": pages}
 
-    if not documents:
-        print("❌ No PDF content loaded.")
+    # Files removed from the folder
+    for file, info in manifest["files"].items():
+        if file not in new_manifest["files"]:
+            print(f"   🗑️ Removed: {file}")
+            for page in info["pages"].values():
+                to_delete.extend(page["ids"])
+
+    if not to_delete and not to_add and manifest["files"]:
+        save_manifest(new_manifest)
+        if not os.path.exists(BM25_PATH):
+            print("   Building missing BM25 keyword index...")
+            build_from_chroma(Chroma(persist_directory=DB_DIR))
+        if not os.path.exists(COMPACT_DIR):
+            print("   Exporting missing compact vector store...")
+            export_from_chroma(Chroma(persist_directory=DB_DIR))
+        print("✅ Index already up to date.")
         return
 
-    print(f"   Loaded {len(documents)} pages.")
-
-    print("2. Splitting text...")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    texts = text_splitter.split_documents(documents)
-    print(f"   Created {len(texts)} text chunks.")
-
-    # --- GPU ACCELERATION CONFIGURATION ---
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    print(f"3. Creating Vector Database using {device.upper()} (Speed Mode)...")
-    
-    model_kwargs = {'device': device}
-    encode_kwargs = {'normalize_embeddings': False}
-    
-    # We use a standard, high-performance model
-    embeddings = HuggingFaceEmbeddings(
-        model_name="all-MiniLM-L6-v2",
-        model_kwargs=model_kwargs,
-        encode_kwargs=encode_kwargs
-    )
-    
-    vector_db = Chroma.from_documents(
-        documents=texts, 
-        embedding=embeddings,
-        persist_directory=DB_DIR
-    )
+    print(f"3. Updating Vector Database (+{len(to_add)} chunks, -{len(to_delete)} chunks)...")
+    # Cached + batched; the model itself only loads if some chunk text was never embedded before
+    embeddings = load_embeddings()
+    vector_db = Chroma(persist_directory=DB_DIR, embedding_function=embeddings)
+
+    # A DB built before the manifest existed has random IDs we can't diff against
+    if not manifest["files"]:
+        legacy_ids = vector_db.get(include=[])["ids"]
+        if legacy_ids:
+            print(f"   🧹 Removing {len(legacy_ids)} vectors from a non-incremental build...")
+            vector_db.delete(ids=legacy_ids)
+
+    if to_delete:
+        vector_db.delete(ids=list(to_delete))
+    if to_add:
+        t0 = time.perf_counter()
+        vector_db.add_documents(to_add, ids=add_ids)
+        embed_seconds = time.perf_counter() - t0
+        print(f"   ⏱️ Embedded + stored {len(to_add)} chunks in {embed_seconds:.1f}s "
+              f"({len(to_add) / max(embed_seconds, 1e-9):.1f} chunks/sec, "
+              f"{embeddings.hits} cache hits / {embeddings.misses} misses, batch size {embeddings.batch_size})")
+
+    save_manifest(new_manifest)
+
+    # Keyword index over exactly the same chunks (used by hybrid/lexical retrieval)
+    print("4. Building BM25 keyword index...")
+    index = build_from_chroma(vector_db)
+    print(f"   {len(index.ids)} chunks, {len(index.postings)} terms -> {BM25_PATH}")
+
+    # Flat quantized copy of the vectors for RAG_VECTOR_BACKEND=compact
+    print("5. Exporting compact vector store...")
+    n = export_from_chroma(vector_db)
+    print(f"   {n} vectors -> {COMPACT_DIR}")
     print(f"✅ Success! Vector DB saved to: {DB_DIR}")
 
 if __name__ == "__main__":
-    build_vector_db()
\ No newline at end of file
+    build_vector_db()
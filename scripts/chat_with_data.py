@@ -1,11 +1,12 @@
 import os
-import torch
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
+import sys
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.chains import RetrievalQA
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.rules_retriever import get_rules_retriever
+
 # Load API Keys
 load_dotenv()
 
@@ -18,17 +19,9 @@ def chat_bot():
         print("❌ Error: DB not found. Run build_rag_db.py first.")
         return
 
-    # 1. Load the "Brain" (Embeddings) - MUST match the build script!
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    print(f"   Using Device: {device.upper()}")
-    
-    embedding_function = HuggingFaceEmbeddings(
-        model_name="all-MiniLM-L6-v2",
-        model_kwargs={'device': device}
-    )
-
-    # 2. Connect to the Database
-    vector_db = Chroma(persist_directory=DB_DIR, embedding_function=embedding_function)
+    # 1 + 2. Connect to the Database: BM25 keyword index + vector DB (RAG_RETRIEVAL_MODE)
+    # The embedding model is only loaded once a question actually needs dense search.
+    retriever = get_rules_retriever(k=3)  # Get top 3 relevant facts
     print("   Database Loaded.")
 
     # 3. Setup the LLM (Google Gemini)
@@ -49,7 +42,7 @@ def chat_bot():
     qa_chain = RetrievalQA.from_chain_type(
         llm=llm,
         chain_type="stuff", # "Stuff" means "stuff all found documents into the prompt"
-        retriever=vector_db.as_retriever(search_kwargs={"k": 3}), # Get top 3 relevant facts
+        retriever=retriever,
         return_source_documents=True # Show us WHERE the answer came from
     )
 
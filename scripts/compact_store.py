@@ -0,0 +1,144 @@
+import os
+import json
+import sqlite3
+import numpy as np
+from typing import Any, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# --- CONFIGURATION ---
+COMPACT_DIR = "chroma_db/compact"
+COMPACT_DTYPE = os.getenv("COMPACT_DTYPE", "float16")  # 'float16' or 'int8'
+BLOCK_ROWS = 8192  # Rows scored per matrix product, bounds the float32 working copy
+EMBED_DIM = 384    # all-MiniLM-L6-v2; only used to shape an empty export
+
+
+def export_from_chroma(vector_db, out_dir=COMPACT_DIR, dtype=COMPACT_DTYPE):
+    """
+    Writes the Chroma collection as a flat matrix + side table:
+      vectors.npy  (n, d) float16, or int8 with a per-row scale in scales.npy
+      meta.sqlite  one row per vector: id, source, page, text, metadata JSON
+    Vectors are L2-normalised, so a dot product is the cosine similarity.
+    """
+    stored = vector_db.get(include=["embeddings", "documents", "metadatas"])
+    if stored["ids"]:
+        vectors = np.asarray(stored["embeddings"], dtype=np.float32).reshape(len(stored["ids"]), -1)
+    else:
+        vectors = np.zeros((0, EMBED_DIM), dtype=np.float32)  # Every PDF removed: empty but loadable
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name in ("vectors.npy", "scales.npy", "meta.sqlite"):
+        if os.path.exists(os.path.join(out_dir, name)):
+            os.remove(os.path.join(out_dir, name))
+
+    if dtype == "int8":
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        np.save(os.path.join(out_dir, "vectors.npy"), np.round(vectors / scales[:, None]).astype(np.int8))
+        np.save(os.path.join(out_dir, "scales.npy"), scales.astype(np.float32))
+    else:
+        np.save(os.path.join(out_dir, "vectors.npy"), vectors.astype(np.float16))
+
+    conn = sqlite3.connect(os.path.join(out_dir, "meta.sqlite"))
+    try:
+        conn.execute("CREATE TABLE chunks (row INTEGER PRIMARY KEY, id TEXT, source TEXT, page INTEGER, text TEXT, metadata TEXT)")
+        conn.execute("CREATE INDEX idx_chunks_source_page ON chunks (source, page)")
+        conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)", [
+            (row, chunk_id, (meta or {}).get("source"), (meta or {}).get("page"), text, json.dumps(meta or {}))
+            for row, (chunk_id, text, meta) in enumerate(zip(stored["ids"], stored["documents"], stored["metadatas"]))
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+    return len(vectors)
+
+
+class CompactVectorStore:
+    """
+    Exact (brute force) cosine search over a memory-mapped float16/int8 matrix.
+    For a few thousand 384-d vectors this is one small matrix product per query batch,
+    with no HNSW files or Chroma client to start.
+    """
+
+    def __init__(self, directory=COMPACT_DIR, embedding_function=None):
+        self.directory = directory
+        self.embedding_function = embedding_function
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode='r')
+        scales_path = os.path.join(directory, "scales.npy")
+        self.scales = np.load(scales_path) if os.path.exists(scales_path) else None
+        self.meta_path = os.path.join(directory, "meta.sqlite")
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    def _rows_matching(self, filter):
+        """Metadata filter, e.g. {"source": "data/reference_docs/refund_rules.pdf", "page": 3}."""
+        if any(col not in ("id", "source", "page") for col in filter):
+            raise ValueError(f"Can only filter on id, source and page, got {list(filter)}")
+        clauses = " AND ".join(f"{col} = ?" for col in filter)
+        with sqlite3.connect(self.meta_path) as conn:
+            rows = conn.execute(f"SELECT row FROM chunks WHERE {clauses}", list(filter.values())).fetchall()
+        return np.array([r[0] for r in rows], dtype=np.int64)
+
+    def scores(self, queries, rows=None):
+        """(n_queries, n_rows) cosine scores, computed block by block."""
+        queries = np.asarray(queries, dtype=np.float32)
+        # Not in place: asarray hands back the caller's own array when it is already float32
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        n = len(self) if rows is None else len(rows)
+        out = np.empty((len(queries), n), dtype=np.float32)
+        for start in range(0, n, BLOCK_ROWS):
+            idx = slice(start, start + BLOCK_ROWS) if rows is None else rows[start:start + BLOCK_ROWS]
+            block = np.asarray(self.vectors[idx], dtype=np.float32)
+            s = queries @ block.T
+            if self.scales is not None:
+                s *= self.scales[idx]
+            out[:, start:start + s.shape[1]] = s
+        return out
+
+    def search_by_vectors(self, queries, k=3, filter=None):
+        """Batched top-k: returns one [(row, score), ...] list per query vector."""
+        rows = self._rows_matching(filter) if filter else None
+        scores = self.scores(queries, rows)
+        k = min(k, scores.shape[1])
+        if k == 0:
+            return [[] for _ in range(len(scores))]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for q, cand in enumerate(top):
+            cand = cand[np.argsort(-scores[q, cand])]
+            ids = cand if rows is None else rows[cand]
+            results.append([(int(r), float(scores[q, c])) for r, c in zip(ids, cand)])
+        return results
+
+    def documents(self, rows):
+        if not rows:
+            return []
+        with sqlite3.connect(self.meta_path) as conn:
+            found = dict(
+                (r, (text, meta)) for r, text, meta in conn.execute(
+                    f"SELECT row, text, metadata FROM chunks WHERE row IN ({','.join('?' * len(rows))})", rows
+                )
+            )
+        return [Document(page_content=found[r][0], metadata=json.loads(found[r][1])) for r in rows]
+
+    def similarity_search_by_vector(self, embedding, k=3, filter=None):
+        hits = self.search_by_vectors([embedding], k, filter)[0]
+        return self.documents([r for r, _ in hits])
+
+    def similarity_search(self, query, k=3, filter=None):
+        return self.similarity_search_by_vector(self.embedding_function.embed_query(query), k, filter)
+
+    def as_retriever(self, search_kwargs=None):
+        search_kwargs = search_kwargs or {}
+        return CompactRetriever(store=self, k=search_kwargs.get("k", 3), filter=search_kwargs.get("filter"))
+
+
+class CompactRetriever(BaseRetriever):
+    store: Any
+    k: int = 3
+    filter: Any = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.store.similarity_search(query, self.k, self.filter)
@@ -0,0 +1,171 @@
+import os
+import math
+from typing import Any, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from scripts.tracing import span
+
+# --- CONFIGURATION ---
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 600))  # 3 raw 1000-char chunks are ~750
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", 5))        # Chunks retrieved before merging
+CHARS_PER_TOKEN = 4     # Rough estimate for English text (no tokenizer dependency)
+MIN_OVERLAP = 30        # Shortest shared text treated as a chunk overlap
+ADJACENT_GAP = 2        # Chunks this close on the page (start_index) are joined
+MIN_TAIL_TOKENS = 50    # Don't bother adding a truncated piece smaller than this
+
+# Running totals so the savings can be inspected (e.g. by the API)
+context_stats = {"requests": 0, "baseline_tokens": 0, "sent_tokens": 0}
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _normalise(text):
+    return " ".join(text.split())
+
+
+def _overlap(a, b):
+    """Length of the longest suffix of `a` that is also a prefix of `b` (0 if < MIN_OVERLAP)."""
+    probe = b[:MIN_OVERLAP]
+    if len(probe) < MIN_OVERLAP:
+        return 0
+    i = a.find(probe)
+    while i != -1:
+        if b.startswith(a[i:]):
+            return len(a) - i
+        i = a.find(probe, i + 1)
+    return 0
+
+
+def _merge_by_offset(chunks):
+    """Chunks with a start_index: sort by position and join overlapping/adjacent ones."""
+    chunks = sorted(chunks, key=lambda c: c["start"])
+    merged = [dict(chunks[0])]
+    for c in chunks[1:]:
+        cur = merged[-1]
+        cur_end = cur["start"] + len(cur["text"])
+        if c["start"] <= cur_end + ADJACENT_GAP:
+            if c["start"] < cur_end:
+                cur["text"] += c["text"][cur_end - c["start"]:]
+            else:
+                cur["text"] += " " + c["text"]
+            cur["rank"] = min(cur["rank"], c["rank"])
+        else:
+            merged.append(dict(c))
+    return merged
+
+
+def _merge_by_text(chunks):
+    """No positions (older index): join chunks whose text overlaps, in either order."""
+    merged = []
+    for c in sorted(chunks, key=lambda c: c["rank"]):
+        c = dict(c)
+        changed = True
+        while changed:
+            changed = False
+            for other in merged:
+                if c["text"] in other["text"]:
+                    text = other["text"]
+                elif other["text"] in c["text"]:
+                    text = c["text"]
+                elif _overlap(other["text"], c["text"]):
+                    text = other["text"] + c["text"][_overlap(other["text"], c["text"]):]
+                elif _overlap(c["text"], other["text"]):
+                    text = c["text"] + other["text"][_overlap(c["text"], other["text"]):]
+                else:
+                    continue
+                merged.remove(other)
+                c = {"text": text, "rank": min(c["rank"], other["rank"]), "start": None, "meta": c["meta"]}
+                changed = True
+                break
+        merged.append(c)
+    return merged
+
+
+def _truncate(text, max_tokens):
+    """Cuts at the last sentence (or word) boundary that fits."""
+    cut = text[:max_tokens * CHARS_PER_TOKEN]
+    for sep in (". ", " "):
+        pos = cut.rfind(sep)
+        if pos > len(cut) // 2:
+            return cut[:pos + 1].strip()
+    return cut
+
+
+def build_context(docs, token_budget=CONTEXT_TOKEN_BUDGET, baseline_k=3):
+    """
+    Turns ranked retrieval hits into the documents handed to the "stuff" prompt:
+      1. chunks from the same source page are merged (overlaps are kept once)
+      2. duplicate / contained text across pages is dropped
+      3. pieces are added best-rank first until the token budget is used up
+    Returns (documents, stats) where stats compares against pasting the top `baseline_k`
+    chunks verbatim (the old behaviour).
+    """
+    pages = {}
+    for rank, doc in enumerate(docs):
+        key = (doc.metadata.get("source"), doc.metadata.get("page"))
+        pages.setdefault(key, []).append({
+            "text": doc.page_content,
+            "start": doc.metadata.get("start_index"),
+            "rank": rank,
+            "meta": doc.metadata,
+        })
+
+    pieces = []
+    for chunks in pages.values():
+        if all(c["start"] is not None for c in chunks):
+            # Offsets refer to the raw page text, so merge first and tidy whitespace after
+            merged = _merge_by_offset(chunks)
+        else:
+            merged = _merge_by_text([dict(c, text=_normalise(c["text"])) for c in chunks])
+        pieces.extend(dict(p, text=_normalise(p["text"])) for p in merged)
+    pieces.sort(key=lambda p: p["rank"])
+
+    kept, used = [], 0
+    for piece in pieces:
+        text = piece["text"]
+        if any(text in k.page_content for k in kept):
+            continue  # Same text already included from another page/source
+        tokens = estimate_tokens(text)
+        remaining = token_budget - used
+        if tokens > remaining:
+            if remaining < MIN_TAIL_TOKENS:
+                break
+            text = _truncate(text, remaining)
+            tokens = estimate_tokens(text)
+        meta = {k: v for k, v in piece["meta"].items() if k != "start_index"}
+        kept.append(Document(page_content=text, metadata=meta))
+        used += tokens
+
+    stats = {
+        "retrieved_chunks": len(docs),
+        "sent_pieces": len(kept),
+        "retrieved_tokens": sum(estimate_tokens(d.page_content) for d in docs),
+        "baseline_tokens": sum(estimate_tokens(d.page_content) for d in docs[:baseline_k]),
+        "sent_tokens": used,
+    }
+    return kept, stats
+
+
+class BudgetedRetriever(BaseRetriever):
+    """Wraps a retriever: fetches CONTEXT_CANDIDATES hits and returns the merged, budgeted context."""
+    base: Any
+    token_budget: int = CONTEXT_TOKEN_BUDGET
+    baseline_k: int = 3
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with span("retrieval", "rules_context") as s:
+            docs = self.base.invoke(query)
+            kept, stats = build_context(docs, self.token_budget, self.baseline_k)
+            s.set(chunks=stats["retrieved_chunks"], context_tokens=stats["sent_tokens"])
+
+        context_stats["requests"] += 1
+        context_stats["baseline_tokens"] += stats["baseline_tokens"]
+        context_stats["sent_tokens"] += stats["sent_tokens"]
+        saved = stats["baseline_tokens"] - stats["sent_tokens"]
+        print(f"   ✂️ Context: {stats['retrieved_chunks']} chunks -> {stats['sent_pieces']} pieces, "
+              f"{stats['sent_tokens']} tokens (top-{self.baseline_k} verbatim: {stats['baseline_tokens']}, saved {saved})")
+        return kept
@@ -0,0 +1,113 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+# --- CONFIGURATION ---
+DATA_PATH = "data/processed/train_delay_history.csv"
+CACHE_DIR = "data/processed/feature_cache"
+
+# Same columns (and order) the Random Forest was trained on in train_model.py
+FEATURES = ['Distance', 'Is_Weekend', 'Month', 'Arrival_Min', 'Zone_Encoded']
+TARGET = 'Delay_Minutes'
+
+
+def arrival_minutes(times):
+    """Vectorised version of time_to_minutes(): '15:30:00' -> 930, anything unparsable -> 0."""
+    parts = times.astype(str).str.split(':', n=2, expand=True)
+    hours = pd.to_numeric(parts[0], errors='coerce')
+    if parts.shape[1] > 1:
+        minutes = pd.to_numeric(parts[1], errors='coerce')
+    else:
+        minutes = pd.Series(np.nan, index=times.index)
+    return (hours * 60 + minutes).fillna(0).astype(int)
+
+
+def _cache_key(data_path):
+    """The cache is only valid for this exact version of the CSV."""
+    stat = os.stat(data_path)
+    raw = f"{os.path.abspath(data_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def _remove_stale(cache_dir, source, keep):
+    """Deletes cached matrices of older versions of the same CSV (the generator rewrites it every run)."""
+    removed = 0
+    for name in os.listdir(cache_dir):
+        folder = os.path.join(cache_dir, name)
+        if name == keep or not os.path.isdir(folder):
+            continue
+        try:
+            with open(os.path.join(folder, "meta.json")) as f:
+                if json.load(f).get("source") != source:
+                    continue
+        except (OSError, ValueError):
+            continue  # Half-written or foreign folder: leave it alone
+        # ignore_errors: on Windows a folder still memory-mapped by another process can't be deleted yet
+        shutil.rmtree(folder, ignore_errors=True)
+        removed += 1
+    return removed
+
+
+def build_feature_matrix(data_path=DATA_PATH, cache_dir=CACHE_DIR):
+    """
+    Builds the model features ONCE and saves them as .npy files.
+    Returns the folder holding X.npy, y.npy, days.npy, zones.npy and meta.json.
+    Re-running with an unchanged CSV is free (cache hit); caches of earlier versions
+    of the same CSV are removed when a new one is written.
+    """
+    folder = os.path.join(cache_dir, _cache_key(data_path))
+    if os.path.exists(os.path.join(folder, "meta.json")):
+        print(f"   ♻️ Feature cache hit: {folder}")
+        return folder
+
+    print(f"   Building feature matrix from {data_path}...")
+    df = pd.read_csv(data_path)
+
+    df['Arrival_Min'] = arrival_minutes(df['Scheduled_Arrival'])
+
+    # np.unique sorts the classes, so the codes match LabelEncoder in train_model.py
+    zone_names, zone_codes = np.unique(df['Zone'].astype(str), return_inverse=True)
+    df['Zone_Encoded'] = zone_codes
+
+    # Dates as "days since epoch" so workers can slice folds with plain integer masks
+    days = pd.to_datetime(df['Date']).values.astype('datetime64[D]').astype(np.int64)
+
+    os.makedirs(folder, exist_ok=True)
+    np.save(os.path.join(folder, "X.npy"), df[FEATURES].to_numpy(dtype=np.float64))
+    np.save(os.path.join(folder, "y.npy"), df[TARGET].to_numpy(dtype=np.float64))
+    np.save(os.path.join(folder, "days.npy"), days)
+    np.save(os.path.join(folder, "zones.npy"), zone_codes.astype(np.int32))
+    with open(os.path.join(folder, "meta.json"), "w") as f:
+        json.dump({
+            "source": os.path.abspath(data_path),
+            "rows": int(len(df)),
+            "features": FEATURES,
+            "target": TARGET,
+            "zones": [str(z) for z in zone_names],
+        }, f, indent=2)
+
+    print(f"   ✅ Cached {len(df)} rows to {folder}")
+    removed = _remove_stale(cache_dir, os.path.abspath(data_path), keep=os.path.basename(folder))
+    if removed:
+        print(f"   🧹 Removed {removed} stale feature cache(s)")
+    return folder
+
+
+def load_feature_matrix(folder, mmap=True):
+    """
+    Opens a cached feature matrix. With mmap=True the arrays are memory-mapped, so
+    several worker processes reading the same folder share one copy in the page cache.
+    """
+    mode = 'r' if mmap else None
+    with open(os.path.join(folder, "meta.json")) as f:
+        meta = json.load(f)
+    return {
+        "X": np.load(os.path.join(folder, "X.npy"), mmap_mode=mode),
+        "y": np.load(os.path.join(folder, "y.npy"), mmap_mode=mode),
+        "days": np.load(os.path.join(folder, "days.npy"), mmap_mode=mode),
+        "zones": np.load(os.path.join(folder, "zones.npy"), mmap_mode=mode),
+        "meta": meta,
+    }
@@ -0,0 +1,162 @@
+import os
+import sys
+import sqlite3
+import hashlib
+from datetime import date
+import numpy as np
+import pandas as pd
+import joblib
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.delay_features import FEATURES, arrival_minutes
+from scripts.tracing import span
+
+# --- CONFIGURATION ---
+DB_PATH = "railways.db"
+MODEL_PATH = "models/delay_model.pkl"
+ENCODER_PATH = "models/zone_encoder.pkl"
+DAYS_AHEAD = int(os.getenv("PREDICTION_DAYS", 7))
+
+UPSERT_SQL = """
+INSERT INTO delay_predictions (train_no, station_code, date, predicted_delay, input_hash, model_version)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (train_no, station_code, date) DO UPDATE SET
+    predicted_delay = excluded.predicted_delay,
+    input_hash = excluded.input_hash,
+    model_version = excluded.model_version
+"""
+
+
+def model_version():
+    """Fingerprint of the model + encoder files. Retraining changes it and forces a recompute."""
+    h = hashlib.sha1()
+    for path in (MODEL_PATH, ENCODER_PATH):
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()[:12]
+
+
+def _ensure_table():
+    # The table itself is declared in database/models.py
+    from database.models import Base, DelayPrediction, engine
+    Base.metadata.create_all(bind=engine, tables=[DelayPrediction.__table__])
+
+
+def _build_inputs(conn, le_zone, days_ahead):
+    """One row per (train_no, station_code, date) for the next `days_ahead` days, with model features."""
+    schedule = pd.read_sql("""
+        SELECT train_no, station_code, arrival_time, distance, zone
+        FROM train_schedules
+        JOIN stations ON train_schedules.station_code = stations.code
+    """, conn)
+    # A train can (rarely) pass the same station twice; the table keys on the pair
+    schedule = schedule.drop_duplicates(subset=['train_no', 'station_code'])
+
+    # Zones the encoder never saw can't be predicted (same rule as evaluate_model.py)
+    known = np.isin(schedule['zone'].astype(str), le_zone.classes_)
+    schedule = schedule[known].copy()
+    schedule['Zone_Encoded'] = le_zone.transform(schedule['zone'].astype(str))
+    schedule['Arrival_Min'] = arrival_minutes(schedule['arrival_time'])
+    schedule['Distance'] = schedule['distance'].fillna(0.0)
+
+    dates = pd.date_range(date.today(), periods=days_ahead, freq='D')
+    calendar = pd.DataFrame({
+        'date': dates.strftime('%Y-%m-%d'),
+        'Is_Weekend': (dates.weekday >= 5).astype(int),
+        'Month': dates.month,
+    })
+    rows = schedule.merge(calendar, how='cross')
+
+    # Hash of the feature values: if these don't change, the prediction can't either
+    rows['input_hash'] = pd.util.hash_pandas_object(rows[FEATURES], index=False).astype(str)
+    return rows[['train_no', 'station_code', 'date', 'input_hash'] + FEATURES]
+
+
+def refresh_predictions(days_ahead=DAYS_AHEAD):
+    """Brings delay_predictions up to date, recomputing only rows whose inputs or model changed."""
+    print("1. Loading Model...")
+    if not os.path.exists(MODEL_PATH) or not os.path.exists(ENCODER_PATH):
+        print("❌ Error: Model not found. Run train_model.py first.")
+        return
+    model = joblib.load(MODEL_PATH)
+    le_zone = joblib.load(ENCODER_PATH)
+    version = model_version()
+    print(f"   Model version: {version}")
+
+    _ensure_table()
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        print(f"2. Building inputs for the next {days_ahead} days...")
+        rows = _build_inputs(conn, le_zone, days_ahead)
+
+        existing = pd.read_sql(
+            "SELECT train_no, station_code, date, input_hash, model_version FROM delay_predictions", conn
+        )
+        merged = rows.merge(existing, on=['train_no', 'station_code', 'date'], how='left',
+                            suffixes=('', '_old'))
+        stale = (merged['input_hash'] != merged['input_hash_old']) | (merged['model_version'] != version)
+        todo = merged[stale]
+        print(f"   {len(rows)} rows in window, {len(rows) - len(todo)} unchanged, {len(todo)} to (re)compute.")
+
+        if len(todo):
+            print("3. Predicting changed rows...")
+            # A DataFrame, like in train_model.py, so sklearn sees the feature names it was fitted with
+            preds = model.predict(todo[FEATURES])
+            conn.executemany(UPSERT_SQL, zip(
+                todo['train_no'].astype(str), todo['station_code'].astype(str), todo['date'],
+                preds.round(1).tolist(), todo['input_hash'], [version] * len(todo),
+            ))
+
+        # Drop past days and schedule rows that no longer exist
+        keys = rows[['train_no', 'station_code', 'date']].assign(keep=True)
+        gone = existing.merge(keys, on=['train_no', 'station_code', 'date'], how='left')
+        gone = gone[gone['keep'].isna()]
+        if len(gone):
+            conn.executemany(
+                "DELETE FROM delay_predictions WHERE train_no = ? AND station_code = ? AND date = ?",
+                gone[['train_no', 'station_code', 'date']].itertuples(index=False, name=None),
+            )
+        conn.commit()
+        print(f"   ✅ Upserted {len(todo)} rows, removed {len(gone)} expired rows.")
+    finally:
+        conn.close()
+
+
+def lookup_prediction(train_no, station_code, on_date=None, db_path=DB_PATH):
+    """Single primary-key lookup. Returns the predicted delay in minutes, or None."""
+    on_date = on_date or date.today().isoformat()
+    conn = sqlite3.connect(db_path)
+    try:
+        with span("sql", "delay_prediction"):
+            row = conn.execute(
+                "SELECT predicted_delay FROM delay_predictions WHERE train_no = ? AND station_code = ? AND date = ?",
+                (str(train_no), station_code.upper(), on_date),
+            ).fetchone()
+    except sqlite3.OperationalError:
+        # Table not materialized yet
+        row = None
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+def first_station_code(candidates, db_path=DB_PATH):
+    """First of the candidate tokens that is a real station code (so 'PNR' or 'AC' are skipped), or None."""
+    candidates = [c.upper() for c in candidates]
+    if not candidates:
+        return None
+    conn = sqlite3.connect(db_path)
+    try:
+        with span("sql", "station_codes"):
+            known = {row[0] for row in conn.execute(
+                f"SELECT code FROM stations WHERE code IN ({','.join('?' * len(candidates))})", candidates)}
+    except sqlite3.OperationalError:
+        known = set()
+    finally:
+        conn.close()
+    return next((c for c in candidates if c in known), None)
+
+
+if __name__ == "__main__":
+    refresh_predictions()
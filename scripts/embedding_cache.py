@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from scripts.tracing import span
+
+# --- CONFIGURATION ---
+EMBED_MODEL = "all-MiniLM-L6-v2"  # MUST be the same for the build script and every query path
+CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "chroma_db/embedding_cache.sqlite")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+LOOKUP_BATCH = 500  # Keys per SELECT ... IN (...) (SQLite has a variable limit)
+QUERY_CACHE_SIZE = int(os.getenv("EMBED_QUERY_CACHE", 1024))  # Recent query vectors kept in memory
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps HuggingFaceEmbeddings with an on-disk cache keyed by model name + text hash.
+
+    Documents that were embedded before (by a previous build or a re-chunking
+    experiment) are read back from SQLite; only the misses go through the model, in
+    batches of `batch_size`. The model itself is loaded lazily, so a run that is fully
+    served from the cache never loads it.
+    Queries are free-form chat text, so they never go to disk: recent ones are kept in
+    a bounded in-memory LRU (same as CPUQueryEncoder).
+    """
+
+    def __init__(self, model_name=EMBED_MODEL, cache_path=CACHE_PATH, batch_size=EMBED_BATCH_SIZE, device=None,
+                 query_cache_size=QUERY_CACHE_SIZE):
+        self.model_name = model_name
+        self.cache_path = cache_path
+        self.batch_size = batch_size
+        self.device = device
+        self.hits = 0
+        self.misses = 0
+        self._model = None
+        self.query_cache_size = query_cache_size
+        self._queries = OrderedDict()
+        self._query_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        with sqlite3.connect(cache_path) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+
+    @property
+    def model(self):
+        if self._model is None:
+            import torch
+            from langchain_huggingface import HuggingFaceEmbeddings
+
+            device = self.device or ("cuda" if torch.cuda.is_available() else "cpu")
+            print(f"   Loading {self.model_name} on {device.upper()}...")
+            self._model = HuggingFaceEmbeddings(
+                model_name=self.model_name,
+                model_kwargs={'device': device},
+                encode_kwargs={'normalize_embeddings': False, 'batch_size': self.batch_size},
+            )
+        return self._model
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, conn, keys):
+        found = {}
+        for i in range(0, len(keys), LOOKUP_BATCH):
+            part = keys[i:i + LOOKUP_BATCH]
+            rows = conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+            ).fetchall()
+            found.update((k, np.frombuffer(v, dtype=np.float32).tolist()) for k, v in rows)
+        return found
+
+    def embed_documents(self, texts):
+        keys = [self._key(t) for t in texts]
+        with sqlite3.connect(self.cache_path) as conn:
+            vectors = self._lookup(conn, list(set(keys)))
+
+            # Embed each missing text once, even if it appears several times
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in vectors:
+                    missing.setdefault(key, text)
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+            miss_keys, miss_texts = list(missing), list(missing.values())
+            for i in range(0, len(miss_texts), self.batch_size):
+                batch = self.model.embed_documents(miss_texts[i:i + self.batch_size])
+                batch_keys = miss_keys[i:i + self.batch_size]
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(k, np.asarray(v, dtype=np.float32).tobytes()) for k, v in zip(batch_keys, batch)],
+                )
+                vectors.update(zip(batch_keys, batch))
+
+        return [list(vectors[k]) for k in keys]
+
+    def embed_query(self, text):
+        with self._query_lock:
+            vector = self._queries.get(text)
+            if vector is not None:
+                self._queries.move_to_end(text)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if vector is None:
+            with span("embedding", "cached"):
+                vector = self.model.embed_query(text)
+            with self._query_lock:
+                self._queries[text] = vector
+                if len(self._queries) > self.query_cache_size:
+                    self._queries.popitem(last=False)
+        return list(vector)
+
+    def clear_query_cache(self):
+        with self._query_lock:
+            self._queries.clear()
+
+
+def load_embeddings(**kwargs):
+    """The one embedding function used by build_rag_db.py, chat_with_data.py and final_agent.py."""
+    return CachedEmbeddings(**kwargs)
@@ -5,14 +5,21 @@ import seaborn as sns
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import os
+import sys
 import numpy as np
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.profiling import Profiler
+
 # --- CONFIGURATION ---
 DATA_PATH = "data/processed/train_delay_history.csv"
 MODEL_PATH = "models/delay_model.pkl"
 ENCODER_PATH = "models/zone_encoder.pkl"
 IMG_PATH = "docs/model_evaluation.png"
 
+# PROFILE=1 (or --profile) writes per-stage timings to docs/profiles/
+profiler = Profiler("evaluate_model")
+
 def evaluate():
     print("1. Loading Artifacts...")
     if not os.path.exists(DATA_PATH) or not os.path.exists(MODEL_PATH):
@@ -20,11 +27,14 @@ def evaluate():
         return
 
     # Load Data
-    df = pd.read_csv(DATA_PATH)
+    with profiler.stage("load_csv") as st:
+        df = pd.read_csv(DATA_PATH)
+        st.rows = len(df)
     
     # Load Model & Encoder
-    model = joblib.load(MODEL_PATH)
-    le_zone = joblib.load(ENCODER_PATH)
+    with profiler.stage("load_model"):
+        model = joblib.load(MODEL_PATH)
+        le_zone = joblib.load(ENCODER_PATH)
 
     # --- PREPROCESSING (Same as Training) ---
     # We must treat the test data EXACTLY like training data
@@ -36,16 +46,18 @@ def evaluate():
         except:
             return 0
             
-    df['Arrival_Min'] = df['Scheduled_Arrival'].apply(time_to_minutes)
+    with profiler.stage("preprocess") as st:
+        st.rows = len(df)
+        df['Arrival_Min'] = df['Scheduled_Arrival'].apply(time_to_minutes)
     
-    # Handle unknown zones in test data safely
-    # (If a new zone appears that wasn't in training, we map it to 'Unknown' or 0)
-    df['Zone_Encoded'] = df['Zone'].apply(lambda x: 
-                                          le_zone.transform([x])[0] if x in le_zone.classes_ 
-                                          else -1)
+        # Handle unknown zones in test data safely
+        # (If a new zone appears that wasn't in training, we map it to 'Unknown' or 0)
+        df['Zone_Encoded'] = df['Zone'].apply(lambda x: 
+                                              le_zone.transform([x])[0] if x in le_zone.classes_ 
+                                              else -1)
     
-    # Filter out rows where Zone was unknown (-1)
-    df = df[df['Zone_Encoded'] != -1]
+        # Filter out rows where Zone was unknown (-1)
+        df = df[df['Zone_Encoded'] != -1]
 
     features = ['Distance', 'Is_Weekend', 'Month', 'Arrival_Min', 'Zone_Encoded']
     target = 'Delay_Minutes'
@@ -58,7 +70,9 @@ def evaluate():
 
     # --- PREDICTION ---
     print("2. Generating Predictions...")
-    y_pred = model.predict(X_test)
+    with profiler.stage("predict") as st:
+        y_pred = model.predict(X_test)
+        st.rows = len(X_test)
 
     # --- METRICS ---
     mae = mean_absolute_error(y_test, y_pred)
@@ -74,6 +88,13 @@ def evaluate():
 
     # --- VISUALIZATION ---
     print("3. Generating Residual Plot...")
+    with profiler.stage("plot"):
+        plot_evaluation(y_test, y_pred, r2)
+    print(f"   ✅ Evaluation chart saved to {IMG_PATH}")
+
+
+def plot_evaluation(y_test, y_pred, r2):
+    """Actual-vs-predicted scatter and residual histogram, saved to IMG_PATH."""
     plt.figure(figsize=(14, 6))
 
     # Subplot 1: Actual vs Predicted
@@ -96,7 +117,7 @@ def evaluate():
 
     plt.tight_layout()
     plt.savefig(IMG_PATH)
-    print(f"   ✅ Evaluation chart saved to {IMG_PATH}")
 
 if __name__ == "__main__":
-    evaluate()
\ No newline at end of file
+    evaluate()
+    profiler.report()
\ No newline at end of file
@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.bm25_index import INDEX_PATH
+from scripts.rules_retriever import get_rules_retriever, bm25_index
+from scripts.query_encoder import query_model_loaded, clear_query_caches
+
+# --- CONFIGURATION ---
+REPORT_PATH = "docs/retrieval_evaluation.json"
+K = 3
+MODES = ["lexical", "auto", "hybrid", "vector"]  # Lexical first: it must not load the embedding model
+
+# Fixed query set. A chunk counts as relevant when it contains ALL the `must` terms.
+QUERIES = [
+    {"query": "tatkal", "must": ["tatkal"]},
+    {"query": "TDR filing", "must": ["tdr"]},
+    {"query": "RAC ticket refund", "must": ["rac"]},
+    {"query": "tatkal ticket cancellation refund", "must": ["tatkal", "refund"]},
+    {"query": "How much is refunded if I cancel a confirmed ticket?", "must": ["cancel", "confirm"]},
+    {"query": "What is the penalty for travelling without a ticket?", "must": ["without", "ticket"]},
+    {"query": "How much luggage can I carry for free?", "must": ["luggage"]},
+    {"query": "Refund when the train is late by more than three hours", "must": ["refund", "late"]},
+    {"query": "waitlisted e-ticket automatic cancellation", "must": ["wait"]},
+    {"query": "senior citizen concession", "must": ["senior"]},
+]
+
+
+def relevant_texts(index, must):
+    return {t for t in index.texts if all(term in t.lower() for term in must)}
+
+
+def evaluate_mode(mode, index):
+    # Every mode (and every rerun) embeds its queries for real instead of timing LRU hits
+    clear_query_caches()
+    t0 = time.perf_counter()
+    retriever = get_rules_retriever(mode=mode, k=K, budgeted=False)
+    load_ms = (time.perf_counter() - t0) * 1000
+
+    latencies, recalls = [], []
+    for q in QUERIES:
+        relevant = relevant_texts(index, q["must"])
+        if not relevant:
+            continue  # This corpus has nothing on the topic
+
+        t0 = time.perf_counter()
+        docs = retriever.invoke(q["query"])
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+        # Recall@k capped by k, so a query with 50 relevant chunks can still score 1.0
+        found = sum(1 for d in docs if d.page_content in relevant)
+        recalls.append(found / min(K, len(relevant)))
+
+    return {
+        "load_ms": round(load_ms, 1),
+        "queries": len(latencies),
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2) if latencies else None,
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2) if latencies else None,
+        f"recall@{K}": round(float(np.mean(recalls)), 3) if recalls else None,
+        "embedding_model_loaded": query_model_loaded(),
+    }
+
+
+def evaluate_retrieval():
+    print("1. Loading BM25 Index...")
+    if not os.path.exists(INDEX_PATH):
+        print("❌ Error: BM25 index not found. Run build_rag_db.py first.")
+        return
+    index = bm25_index()
+    print(f"   {len(index.ids)} chunks indexed.")
+
+    print(f"2. Running {len(QUERIES)} fixed queries per mode...")
+    report = {"k": K, "modes": {}}
+    for mode in MODES:
+        result = evaluate_mode(mode, index)
+        report["modes"][mode] = result
+        print(f"   {mode:<8} recall@{K}: {result[f'recall@{K}']} | "
+              f"p50 {result['latency_ms_p50']} ms | p95 {result['latency_ms_p95']} ms | "
+              f"model loaded: {result['embedding_model_loaded']}")
+
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+    with open(REPORT_PATH, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"   ✅ Report saved to {REPORT_PATH}")
+
+
+if __name__ == "__main__":
+    evaluate_retrieval()
@@ -1,19 +1,25 @@
 import os
+import re
+import sys
 import sqlite3
-import torch
 from dotenv import load_dotenv
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.chains import RetrievalQA
 from langchain.agents import initialize_agent, Tool, AgentType
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.delay_predictions import lookup_prediction, first_station_code
+from scripts.rules_retriever import get_rules_retriever
+from scripts.function_agent import FunctionCallingAgent, MeasuredAgent, LLM_CALL_COUNTER
+from scripts.tracing import span, traced, TRACE_CALLBACK
+
 # Load Keys
 load_dotenv()
 
 # --- CONFIGURATION ---
 DB_PATH = "railways.db"
 CHROMA_PATH = "chroma_db"
+AGENT_MODE = os.getenv("AGENT_MODE", "react")  # "react" or "function_calling"
 
 # 1. Setup SQL Tool (For Train Schedules)
 def query_sql_db(query):
@@ -29,8 +35,9 @@ def query_sql_db(query):
         
         sql = f"SELECT train_number, train_name, source_station_name, destination_station_name FROM trains WHERE source_station_name LIKE '%{search_term}%' OR destination_station_name LIKE '%{search_term}%' LIMIT 5"
         
-        cursor.execute(sql)
-        rows = cursor.fetchall()
+        with span("sql", "trains_by_station"):
+            cursor.execute(sql)
+            rows = cursor.fetchall()
         conn.close()
         
         if not rows:
@@ -43,50 +50,79 @@ def query_sql_db(query):
 # 2. Setup PDF Tool (For Rules)
 def query_rules(query):
     """Useful for answering questions about rules, refunds, and penalties."""
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    embedding_function = HuggingFaceEmbeddings(
-        model_name="all-MiniLM-L6-v2",
-        model_kwargs={'device': device}
-    )
-    vector_db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_function)
-    
-    llm = ChatGoogleGenerativeAI(model="models/gemini-flash-latest", temperature=0.3)
+    llm = ChatGoogleGenerativeAI(model="models/gemini-flash-latest", temperature=0.3,
+                                 callbacks=[LLM_CALL_COUNTER, TRACE_CALLBACK])
     
     qa_chain = RetrievalQA.from_chain_type(
         llm=llm,
         chain_type="stuff",
-        retriever=vector_db.as_retriever(search_kwargs={"k": 3})
+        # Hybrid BM25 + vector search (see rules_retriever.py); loaded once, reused across calls
+        retriever=get_rules_retriever(k=3)
     )
     return qa_chain.invoke({"query": query})['result']
 
-# 3. Initialize the Agent
+def retrieve_rules(query):
+    """Rules passages only (no LLM) - the function-calling agent answers from them itself."""
+    docs = get_rules_retriever(k=3).invoke(query)
+    if not docs:
+        return "No matching rules found."
+    return "\n\n".join(d.page_content for d in docs)
+
+# 3. Setup Delay Tool (Reads the precomputed delay_predictions table)
+def query_delay_prediction(query):
+    """Useful for predicting how late a train will be at a station."""
+    train = re.search(r"\b\d{5}\b", query)
+    # Other capitalised words ("PNR", "AC", "ETA") look like codes too: take the first real station
+    station = first_station_code(re.findall(r"\b[A-Z]{2,5}\b", query))
+    day = re.search(r"\d{4}-\d{2}-\d{2}", query)
+    if not train or not station:
+        return "Please give a 5-digit train number and a station code (e.g. 12951 NDLS)."
+
+    delay = lookup_prediction(train.group(), station, day.group() if day else None)
+    if delay is None:
+        return "No prediction available for that train, station and date."
+    return f"Predicted delay for train {train.group()} at {station}: {delay:.0f} minutes."
+
+# 4. Initialize the Agent
 # ... (imports and tool definitions remain the same) ...
 
 # RENAME THIS FUNCTION
-def initialize_agent_system():
+def initialize_agent_system(mode=None):
+    mode = mode or AGENT_MODE
     # Use the safe model alias
-    llm = ChatGoogleGenerativeAI(model="models/gemini-flash-latest", temperature=0)
+    llm = ChatGoogleGenerativeAI(model="models/gemini-flash-latest", temperature=0,
+                                 callbacks=[LLM_CALL_COUNTER, TRACE_CALLBACK])
 
     tools = [
         Tool(
             name="Train Schedule DB",
-            func=query_sql_db,
+            func=traced("tool", "train_schedule_db")(query_sql_db),
             description="Use this to find train numbers, routes, and schedules."
         ),
         Tool(
             name="Railway Rules",
-            func=query_rules,
+            # Function calling synthesises once itself, so it only needs the passages
+            func=traced("tool", "railway_rules")(retrieve_rules if mode == "function_calling" else query_rules),
             description="Use this to look up rules about refunds, luggage, and tatkal."
+        ),
+        Tool(
+            name="Delay Prediction",
+            func=traced("tool", "delay_prediction")(query_delay_prediction),
+            description="Use this to predict a train's delay at a station. Input must contain the 5-digit train number, the station code and optionally a date (YYYY-MM-DD)."
         )
     ]
 
+    # One planning call + parallel tools + one answer call (see function_agent.py)
+    if mode == "function_calling":
+        return FunctionCallingAgent(llm, tools)
+
     # Initialize and RETURN the agent
-    return initialize_agent(
+    return MeasuredAgent(initialize_agent(
         tools, 
         llm, 
         agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION, 
         verbose=True
-    )
+    ))
 
 # REMOVE the "while True" loop from here!
 if __name__ == "__main__":
@@ -2,52 +2,106 @@ import pandas as pd
 import matplotlib.pyplot as plt
 from statsmodels.tsa.holtwinters import ExponentialSmoothing
 import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.online_forecast import HoltWintersState, fit_to_state
+from scripts.profiling import Profiler
 
 # --- CONFIGURATION ---
 INPUT_FILE = "data/processed/train_delay_history.csv"
 OUTPUT_IMG = "docs/forecast_plot.png"
 OUTPUT_CSV = "data/processed/forecast_results.csv"
+STATE_FILE = "models/hw_system_state.npz"  # Saved level/trend/season so later runs skip the refit
 
 # Ensure directories exist
 os.makedirs("docs", exist_ok=True)
 
+# PROFILE=1 (or --profile) writes per-stage timings to docs/profiles/
+profiler = Profiler("forcast_delays")
+
 def run_forecasting():
+    t0 = time.perf_counter()
     print("1. Loading & Aggregating Data...")
     if not os.path.exists(INPUT_FILE):
         print("❌ Error: History file not found.")
         return
 
-    # Load individual train delays
-    df = pd.read_csv(INPUT_FILE)
+    with profiler.stage("load_aggregate") as st:
+        # Load individual train delays
+        df = pd.read_csv(INPUT_FILE)
     
-    # Convert 'Date' to datetime objects
-    df['Date'] = pd.to_datetime(df['Date'])
+        # Convert 'Date' to datetime objects
+        df['Date'] = pd.to_datetime(df['Date'])
     
-    # AGGREGATION: We need ONE number per day (Total Delay Minutes)
-    daily_data = df.groupby('Date')['Delay_Minutes'].sum()
+        # AGGREGATION: We need ONE number per day (Total Delay Minutes)
+        daily_data = df.groupby('Date')['Delay_Minutes'].sum()
+        st.rows = len(df)
     
     # Set the frequency to 'Daily' (D)
     daily_data.index.freq = 'D'
     
     print(f"   Analyzed {len(daily_data)} days of historical data.")
 
-    # --- MODEL TRAINING ---
-    print("2. Training Holt-Winters Model...")
-    # 'add' means additive seasonality (Delay + Seasonal Effect)
-    # seasonal_periods=7 means we expect a weekly pattern (Weekends vs Weekdays)
-    model = ExponentialSmoothing(
-        daily_data, 
-        trend='add', 
-        seasonal='add', 
-        seasonal_periods=7
-    ).fit()
+    # --- ONLINE UPDATE (if we already have a fitted state) ---
+    forecast = None
+    state = HoltWintersState.load(STATE_FILE) if os.path.exists(STATE_FILE) else None
+    if state is not None and not state.fitted_on(daily_data):
+        # e.g. generating_training_data.py wrote a new random history: the saved
+        # level/trend/season describe days that are no longer in the CSV
+        print("   ⚠️ Saved model was fitted on a different history, refitting from scratch.")
+        state = None
+    if state is not None:
+        new_days = daily_data[daily_data.index > state.last_date]
+        print(f"2. Updating saved model with {len(new_days)} new day(s)...")
+        with profiler.stage("online_update") as st:
+            state.update_many(new_days.to_frame())
+            st.rows = len(new_days)
+
+        if state.needs_refit()[0]:
+            print("   ⚠️ Forecast error has drifted, refitting from scratch.")
+        else:
+            state.stamp(daily_data)
+            state.save(STATE_FILE)
+            # The CSV is rewritten whole by the generator, so the read is part of every update
+            print(f"   ⏱️ Updated in {(time.perf_counter() - t0) * 1000:.0f} ms (including the CSV read)")
+            print("3. Forecasting Next 30 Days...")
+            dates = pd.date_range(state.last_date + pd.Timedelta(days=1), periods=30, freq='D')
+            forecast = pd.Series(state.forecast(30)[0], index=dates)
+
+    if forecast is None:
+        # --- MODEL TRAINING ---
+        print("2. Training Holt-Winters Model...")
+        # 'add' means additive seasonality (Delay + Seasonal Effect)
+        # seasonal_periods=7 means we expect a weekly pattern (Weekends vs Weekdays)
+        with profiler.stage("fit_holt_winters") as st:
+            model = ExponentialSmoothing(
+                daily_data, 
+                trend='add', 
+                seasonal='add', 
+                seasonal_periods=7
+            ).fit()
+            st.rows = len(daily_data)
 
-    # --- FORECASTING ---
-    print("3. Forecasting Next 30 Days...")
-    forecast = model.forecast(30)
+        # Save the fitted state so the next run only has to fold in new days
+        state = HoltWintersState.from_states(["ALL"], [fit_to_state(model, daily_data.values)],
+                                             last_date=daily_data.index[-1])
+        state.stamp(daily_data)
+        state.save(STATE_FILE)
+
+        # --- FORECASTING ---
+        print("3. Forecasting Next 30 Days...")
+        forecast = model.forecast(30)
     
     # --- VISUALIZATION ---
     print("4. Generating Plot...")
+    with profiler.stage("plot_and_save"):
+        plot_and_save(daily_data, forecast)
+
+
+def plot_and_save(daily_data, forecast):
+    """Chart of the last 30 days plus the forecast, and the forecast as CSV."""
     plt.figure(figsize=(12, 6))
     
     # Plot past data (Last 30 days only, to keep chart readable)
@@ -72,4 +126,5 @@ def run_forecasting():
     print(f"   ✅ Forecast data saved to {OUTPUT_CSV}")
 
 if __name__ == "__main__":
-    run_forecasting()
\ No newline at end of file
+    run_forecasting()
+    profiler.report()
\ No newline at end of file
@@ -0,0 +1,278 @@
+import os
+import sys
+import time
+import argparse
+import sqlite3
+import warnings
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from statsmodels.tsa.holtwinters import ExponentialSmoothing
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.online_forecast import HoltWintersState, fit_to_state, seasonal_naive_state
+
+# --- CONFIGURATION ---
+INPUT_FILE = "data/processed/train_delay_history.csv"
+DB_PATH = "railways.db"
+STATE_PATH = "models/hw_hierarchy_state.npz"         # Fitted state for --update runs
+HORIZON = 30                                        # Days to forecast (same as forcast_delays.py)
+SEASON = 7                                          # Weekly pattern
+BUSY_STATIONS = int(os.getenv("BUSY_STATIONS", 500))  # Stations that get their own series
+CHUNK_SIZE = 50                                     # Series per task sent to a worker
+MAX_WORKERS = int(os.getenv("FORECAST_WORKERS", os.cpu_count() or 1))
+# --update refits drifted series one by one; past this share of all series it refits everything
+REFIT_ALL_FRACTION = float(os.getenv("HW_REFIT_ALL_FRACTION", 0.25))
+
+SYSTEM = "ALL"
+OTHER = "/OTHER"  # '<ZONE>/OTHER' pools a zone's quieter stations (level 'zone_other')
+
+
+def build_hierarchy(df, busy_stations=BUSY_STATIONS):
+    """
+    Turns the raw history into a daily matrix for every level of the hierarchy.
+
+    Busy stations keep their own series; quieter stations are pooled into one
+    '<ZONE>/OTHER' series per zone so the bottom level still adds up to each zone.
+    There is a single groupby over the raw rows; zone and system totals are then
+    summed from the (small) bottom-level matrix.
+
+    Returns (bottom, zones, system, zone_of) where bottom/zones are DataFrames
+    (index = Date, one column per series), system is a Series and zone_of maps each
+    bottom column to its zone.
+    """
+    df = df[['Date', 'Zone', 'Station_Code', 'Delay_Minutes']].copy()
+    df['Date'] = pd.to_datetime(df['Date'])
+    df['Zone'] = df['Zone'].astype(str)
+
+    busy = df['Station_Code'].value_counts().index[:busy_stations]
+    df['Series'] = np.where(df['Station_Code'].isin(busy), df['Station_Code'], df['Zone'] + OTHER)
+
+    grouped = df.groupby(['Date', 'Zone', 'Series'], sort=False)['Delay_Minutes'].sum()
+
+    # Wide matrix: every day in the range, missing days = 0 delay minutes
+    bottom = grouped.unstack(['Zone', 'Series'], fill_value=0)
+    bottom = bottom.reindex(pd.date_range(bottom.index.min(), bottom.index.max(), freq='D'), fill_value=0)
+    bottom = bottom.sort_index(axis=1)
+
+    zone_of = pd.Series(bottom.columns.get_level_values('Zone'),
+                        index=bottom.columns.get_level_values('Series'))
+    bottom.columns = bottom.columns.get_level_values('Series')
+
+    zones = bottom.T.groupby(zone_of.values).sum().T
+    system = bottom.sum(axis=1).rename(SYSTEM)
+    return bottom, zones, system, zone_of
+
+
+def fit_series(values):
+    """
+    Holt-Winters for one series, with a seasonal-naive fallback for series too short/flat
+    to fit. Returns the fitted state (see online_forecast.py) rather than the forecast,
+    so it can be persisted and updated day by day.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) >= 2 * SEASON and values.any():
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                model = ExponentialSmoothing(values, trend='add', seasonal='add', seasonal_periods=SEASON).fit()
+            return fit_to_state(model, values)
+        except Exception:
+            pass
+    return seasonal_naive_state(values)
+
+
+def _fit_chunk(chunk):
+    """Runs in a worker process: fits a batch of (position, values) series."""
+    return [(i, fit_series(values)) for i, values in chunk]
+
+
+def aggregation_matrix(zone_names, zone_of):
+    """Row 0 = system (every bottom series), then one 0/1 row per zone."""
+    zone_of = np.asarray(zone_of, dtype=str)
+    return np.vstack([
+        np.ones(len(zone_of)),
+        (zone_of[None, :] == np.asarray(zone_names, dtype=str)[:, None]).astype(float),
+    ])
+
+
+def reconcile(base_agg, base_bottom, agg_matrix):
+    """
+    Makes the forecasts coherent (stations sum to zones, zones sum to the system).
+
+    Weighted least squares with structural weights (each series weighted by how many
+    bottom series it contains). The summing matrix is [agg_matrix; I], so the normal
+    equations are diagonal + low rank and Woodbury keeps this O(n) in bottom series
+    instead of solving an n x n system.
+
+    base_agg: (n_agg, H), base_bottom: (n_bottom, H), agg_matrix: (n_agg, n_bottom) of 0/1.
+    Returns (reconciled_agg, reconciled_bottom).
+    """
+    w_agg = agg_matrix.sum(axis=1)             # bottom weights are all 1
+    rhs = base_bottom + agg_matrix.T @ (base_agg / w_agg[:, None])
+    small = np.diag(w_agg) + agg_matrix @ agg_matrix.T
+    bottom = rhs - agg_matrix.T @ np.linalg.solve(small, agg_matrix @ rhs)
+    return agg_matrix @ bottom, bottom
+
+
+def save_forecasts(rows, db_path=DB_PATH):
+    """Replaces the stored forecasts with this run's rows (one transaction)."""
+    from database.models import Base, DelayForecast, engine
+    Base.metadata.create_all(bind=engine, tables=[DelayForecast.__table__])
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("DELETE FROM delay_forecasts")
+        conn.executemany(
+            "INSERT INTO delay_forecasts (level, series, date, base_forecast, forecast, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_hierarchical_forecast():
+    print("1. Loading & Aggregating Data...")
+    if not os.path.exists(INPUT_FILE):
+        print("❌ Error: History file not found.")
+        return
+
+    df = pd.read_csv(INPUT_FILE)
+    bottom, zones, system, zone_of = build_hierarchy(df)
+    print(f"   {len(bottom)} days | 1 system, {zones.shape[1]} zones, {bottom.shape[1]} station series")
+
+    # Keyed by position: a station code may coincide with a zone code
+    series = [system.values] + [zones[z].values for z in zones.columns] + [bottom[s].values for s in bottom.columns]
+    series = list(enumerate(series))
+    chunks = [series[i:i + CHUNK_SIZE] for i in range(0, len(series), CHUNK_SIZE)]
+
+    print(f"2. Fitting {len(series)} Holt-Winters models on {MAX_WORKERS} processes...")
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        fitted = dict(item for chunk in pool.map(_fit_chunk, chunks) for item in chunk)
+    fit_seconds = time.perf_counter() - t0
+    print(f"   ⏱️ Total fit time: {fit_seconds:.2f}s ({len(series) / fit_seconds:.0f} series/sec)")
+
+    zone_names = [str(z) for z in zones.columns]
+    state = HoltWintersState.from_states(
+        [SYSTEM] + zone_names + list(bottom.columns),
+        [fitted[i] for i in range(len(series))],
+        last_date=bottom.index[-1],
+        extra={
+            # Pooled series get their own level, so level = 'station' only returns real stations
+            "levels": ['system'] + ['zone'] * len(zone_names)
+                      + ['zone_other' if s.endswith(OTHER) else 'station' for s in bottom.columns],
+            "zone_names": zone_names,
+            "zone_of": zone_of.to_numpy(dtype=str),
+        },
+    )
+    state.stamp(daily_observations(df, state))
+    state.save(STATE_PATH)
+    print(f"   ✅ Fitted state saved to {STATE_PATH}")
+
+    publish_forecasts(state)
+
+
+def publish_forecasts(state):
+    """Forecasts every series from the state, reconciles the levels and stores the result."""
+    print("3. Reconciling Levels...")
+    n_agg = 1 + len(state.extra["zone_names"])
+    base = state.forecast(HORIZON)
+    agg_matrix = aggregation_matrix(state.extra["zone_names"], state.extra["zone_of"])
+    rec = np.vstack(reconcile(base[:n_agg], base[n_agg:], agg_matrix))
+
+    print("4. Saving Forecasts...")
+    dates = pd.date_range(state.last_date + pd.Timedelta(days=1), periods=HORIZON, freq='D').strftime('%Y-%m-%d')
+    created = time.strftime("%Y-%m-%dT%H:%M:%S")
+    rows = [
+        (level, name, d, float(base[i, h]), float(rec[i, h]), created)
+        for i, (level, name) in enumerate(zip(state.extra["levels"], state.names))
+        for h, d in enumerate(dates)
+    ]
+    save_forecasts(rows)
+    print(f"   ✅ Saved {len(rows)} forecast rows to {DB_PATH} (delay_forecasts)")
+
+
+def daily_observations(df, state, since=None):
+    """
+    Aggregates raw history rows onto the series layout saved in the state (days x series),
+    from the day after `since` (default: from the first recorded day).
+    """
+    df = df[['Date', 'Zone', 'Station_Code', 'Delay_Minutes']].copy()
+    df['Date'] = pd.to_datetime(df['Date'])
+    df['Zone'] = df['Zone'].astype(str)
+
+    # Real stations only ('zone_other' series are rebuilt from the zone below)
+    stations = set(state.names[np.asarray(state.extra["levels"]) == 'station'])
+    df['Series'] = np.where(df['Station_Code'].isin(stations), df['Station_Code'], df['Zone'] + OTHER)
+
+    bottom = df.groupby(['Date', 'Series'])['Delay_Minutes'].sum().unstack(fill_value=0)
+    start = since + pd.Timedelta(days=1) if since is not None else bottom.index.min()
+    days = pd.date_range(start, bottom.index.max(), freq='D')
+    # Zones/stations that didn't exist at fit time are dropped until the next refit
+    bottom = bottom.reindex(index=days, columns=state.names[len(state.extra["zone_names"]) + 1:], fill_value=0)
+
+    zones = bottom.T.groupby(state.extra["zone_of"]).sum().T.reindex(columns=state.extra["zone_names"], fill_value=0)
+    system = bottom.sum(axis=1).rename(SYSTEM)
+    return pd.concat([system, zones, bottom], axis=1)
+
+
+def update_hierarchical_forecast():
+    """
+    Daily refresh without refitting: folds the days recorded since the last run into
+    the saved state and republishes the 30-day forecast. Series whose one-step error
+    has drifted are refitted on their own history and spliced back into the state;
+    only when there is no state yet, the state doesn't match the CSV's history, or a
+    large share has drifted, is everything refit.
+    """
+    if not os.path.exists(STATE_PATH):
+        print("   No saved state yet, running a full fit.")
+        return run_hierarchical_forecast()
+
+    t0 = time.perf_counter()
+    state = HoltWintersState.load(STATE_PATH)
+    print(f"1. Loading observations after {state.last_date.date()}...")
+    # The CSV is rewritten (not appended) by the generator, so it is read whole; the
+    # full history is also what a drifted series is refitted on
+    df = pd.read_csv(INPUT_FILE, usecols=['Date', 'Zone', 'Station_Code', 'Delay_Minutes'])
+    history = daily_observations(df, state)
+    if not state.fitted_on(history):
+        # e.g. generating_training_data.py wrote a new random history: the saved
+        # level/trend/season describe days that are no longer in the CSV
+        print("   ⚠️ Saved state was fitted on a different history, running a full refit.")
+        return run_hierarchical_forecast()
+    daily = history[history.index > state.last_date]
+    if daily.empty:
+        print("   Nothing new to fold in.")
+        return
+
+    state.update_many(daily)
+    print(f"   ⏱️ Folded {len(daily)} day(s) into {len(state.names)} series "
+          f"in {(time.perf_counter() - t0) * 1000:.0f} ms (including the CSV read)")
+
+    drifted = np.flatnonzero(state.needs_refit())
+    if len(drifted) > REFIT_ALL_FRACTION * len(state.names):
+        print(f"   ⚠️ {len(drifted)} of {len(state.names)} series drifted, running a full refit.")
+        return run_hierarchical_forecast()
+    if len(drifted):
+        t1 = time.perf_counter()
+        history = history[history.index <= state.last_date]
+        state.replace(drifted, [fit_series(history.iloc[:, i].values) for i in drifted])
+        print(f"   🔁 Refitted {len(drifted)} drifted series in {time.perf_counter() - t1:.2f}s")
+
+    state.stamp(history)
+    state.save(STATE_PATH)
+    publish_forecasts(state)
+    print(f"   ⏱️ End-to-end update: {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-zone / per-station delay forecasts")
+    parser.add_argument("--update", action="store_true",
+                        help="Fold new days into the saved state instead of refitting everything")
+    if parser.parse_args().update:
+        update_hierarchical_forecast()
+    else:
+        run_hierarchical_forecast()
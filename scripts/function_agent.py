@@ -0,0 +1,179 @@
+import os
+import re
+import time
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+
+from scripts.tracing import span
+
+# --- CONFIGURATION ---
+MAX_LLM_CALLS = int(os.getenv("AGENT_MAX_LLM_CALLS", 2))  # plan + synthesis
+TOOL_WORKERS = 4
+
+PLANNER_PROMPT = """You are the Indian Railways assistant.
+Decide which tools are needed to answer the user's question and call ALL of them now,
+in this single response - they run in parallel and you will not get another turn to call more.
+If no tool is needed, answer the question directly.
+
+Question: {question}"""
+
+SYNTHESIS_PROMPT = """You are the Indian Railways assistant.
+Answer the user's question using only the tool results below. If they don't contain the
+answer, say so.
+
+Question: {question}
+
+Tool results:
+{results}"""
+
+# Used instead of the synthesis call when the LLM-call cap leaves no room for it
+TOOL_RESULTS_ANSWER = """I couldn't write a full answer this time, but this is what I found:
+
+{results}"""
+
+# --- PER-REQUEST MEASUREMENT (used by both agent modes) ---
+_llm_calls = contextvars.ContextVar("llm_calls", default=None)
+run_stats = deque(maxlen=1000)
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """Attach to every LLM (callbacks=[LLM_CALL_COUNTER]) to count its calls per request."""
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        counter = _llm_calls.get()
+        if counter is not None:
+            counter[0] += 1
+
+
+LLM_CALL_COUNTER = LLMCallCounter()
+
+
+class LLMCallLimitExceeded(RuntimeError):
+    pass
+
+
+def _measured(mode, run):
+    """Runs `run()` with a fresh LLM-call counter and records calls + wall time."""
+    counter = [0]
+    token = _llm_calls.set(counter)
+    t0 = time.perf_counter()
+    try:
+        with span("agent", mode):
+            result = run()
+    finally:
+        _llm_calls.reset(token)
+    stats = {"mode": mode, "llm_calls": counter[0], "wall_ms": round((time.perf_counter() - t0) * 1000, 1)}
+    run_stats.append(stats)
+    return result, stats
+
+
+def agent_stats_summary():
+    """Per-mode averages over the recent requests, for comparing ReAct with function calling."""
+    summary = {}
+    for mode in {s["mode"] for s in run_stats}:
+        runs = [s for s in run_stats if s["mode"] == mode]
+        wall = np.array([s["wall_ms"] for s in runs])
+        summary[mode] = {
+            "requests": len(runs),
+            "avg_llm_calls": round(float(np.mean([s["llm_calls"] for s in runs])), 2),
+            "wall_ms_p50": round(float(np.percentile(wall, 50)), 1),
+            "wall_ms_p95": round(float(np.percentile(wall, 95)), 1),
+        }
+    return summary
+
+
+class MeasuredAgent:
+    """Wraps the ReAct AgentExecutor so its requests are measured the same way."""
+
+    def __init__(self, agent):
+        self.agent = agent
+
+    def invoke(self, question):
+        result, stats = _measured("react", lambda: self.agent.invoke(question))
+        result = result if isinstance(result, dict) else {"output": str(result)}
+        return {**result, **stats}
+
+
+def _function_name(tool_name):
+    """'Train Schedule DB' -> 'train_schedule_db' (function names can't have spaces)."""
+    return re.sub(r"[^a-z0-9_]", "_", tool_name.lower())
+
+
+class FunctionCallingAgent:
+    """
+    Plan -> parallel tools -> answer, with a hard cap on LLM calls:
+      1. one LLM call with all tools bound returns every tool call it needs at once
+      2. those tools run concurrently in a thread pool
+      3. one more LLM call writes the answer from the tool results
+    Questions that need no tool are answered by the first call. If the cap leaves no
+    call for step 3 (AGENT_MAX_LLM_CALLS=1), the tool results are returned as they are.
+    """
+
+    def __init__(self, llm, tools, max_llm_calls=MAX_LLM_CALLS):
+        if max_llm_calls < 1:
+            raise ValueError("AGENT_MAX_LLM_CALLS must be at least 1 (the planning call)")
+        self.llm = llm
+        self.tools = {_function_name(t.name): t for t in tools}
+        self.max_llm_calls = max_llm_calls
+        self.planner = llm.bind_tools([{
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": tool.description,
+                "parameters": {
+                    "type": "object",
+                    "properties": {"query": {"type": "string", "description": "Input for the tool"}},
+                    "required": ["query"],
+                },
+            },
+        } for name, tool in self.tools.items()])
+
+    def _call(self, runnable, prompt, calls):
+        if calls[0] >= self.max_llm_calls:
+            raise LLMCallLimitExceeded(f"More than {self.max_llm_calls} LLM calls for one request")
+        calls[0] += 1
+        return runnable.invoke([HumanMessage(content=prompt)])
+
+    def _run_tool(self, call):
+        tool = self.tools.get(call["name"])
+        if tool is None:
+            return f"Unknown tool {call['name']}"
+        try:
+            return str(tool.func(call["args"].get("query", "")))
+        except Exception as e:
+            return f"Tool error: {e}"
+
+    def _answer(self, question):
+        calls = [0]
+        with span("agent_step", "plan"):
+            plan = self._call(self.planner, PLANNER_PROMPT.format(question=question), calls)
+        tool_calls = plan.tool_calls
+        if not tool_calls:
+            return {"output": plan.content, "tool_calls": []}
+
+        # Independent tools run side by side; each thread keeps the request's context (LLM counter)
+        with span("agent_step", "tools", tools=len(tool_calls)), \
+                ThreadPoolExecutor(max_workers=min(TOOL_WORKERS, len(tool_calls))) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, self._run_tool, c) for c in tool_calls]
+            outputs = [f.result() for f in futures]
+
+        if calls[0] >= self.max_llm_calls:
+            # Out of LLM calls: degrade to the raw tool outputs instead of failing the request
+            results = "\n\n".join(f"{self.tools[c['name']].name}: {out}" if c["name"] in self.tools else out
+                                  for c, out in zip(tool_calls, outputs))
+            return {"output": TOOL_RESULTS_ANSWER.format(results=results),
+                    "tool_calls": [c["name"] for c in tool_calls]}
+
+        results = "\n\n".join(f"[{c['name']}({c['args'].get('query', '')!r})]\n{out}"
+                              for c, out in zip(tool_calls, outputs))
+        with span("agent_step", "synthesis"):
+            answer = self._call(self.llm, SYNTHESIS_PROMPT.format(question=question, results=results), calls)
+        return {"output": answer.content, "tool_calls": [c["name"] for c in tool_calls]}
+
+    def invoke(self, question):
+        result, stats = _measured("function_calling", lambda: self._answer(question))
+        return {**result, **stats}
@@ -3,30 +3,24 @@ import numpy as np
 import random
 from datetime import datetime, timedelta
 from sqlalchemy import create_engine
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.profiling import Profiler
 
 
 # Connect to your Warehouse
 db_path = "sqlite:///railways.db"
 engine = create_engine(db_path)
 
-def generate_history():
-    print("1. Reading Schedules from DB...")
-    # Get all schedules (Limit to top 50 trains to keep it fast for now)
-    query = """
-    SELECT train_no, station_code, arrival_time, distance, zone 
-    FROM train_schedules 
-    JOIN stations ON train_schedules.station_code = stations.code
-    WHERE train_no IN (SELECT DISTINCT train_no FROM train_schedules LIMIT 50)
-    """
-    df_schedule = pd.read_sql(query, engine)
-    
-    print(f"   Loaded {len(df_schedule)} schedule rows. Generating history...")
-    
+# PROFILE=1 (or --profile) writes per-stage timings to docs/profiles/
+profiler = Profiler("generating_training_data")
+
+def simulate_history(df_schedule, start_date):
+    """One simulated trip per sampled schedule row, for each of the 90 days from start_date."""
     history_data = []
     
-    # Simulate the last 90 days
-    start_date = datetime.now() - timedelta(days=90)
-    
     for day_offset in range(90):
         current_date = start_date + timedelta(days=day_offset)
         
@@ -76,11 +70,37 @@ def generate_history():
                 # --- THE TARGET (LABEL) ---
                 'Delay_Minutes': delay
             })
-            
+
+    return history_data
+
+
+def generate_history():
+    print("1. Reading Schedules from DB...")
+    # Get all schedules (Limit to top 50 trains to keep it fast for now)
+    query = """
+    SELECT train_no, station_code, arrival_time, distance, zone 
+    FROM train_schedules 
+    JOIN stations ON train_schedules.station_code = stations.code
+    WHERE train_no IN (SELECT DISTINCT train_no FROM train_schedules LIMIT 50)
+    """
+    with profiler.stage("read_schedules") as st:
+        df_schedule = pd.read_sql(query, engine)
+        st.rows = len(df_schedule)
+    
+    print(f"   Loaded {len(df_schedule)} schedule rows. Generating history...")
+    
+    # Simulate the last 90 days
+    start_date = datetime.now() - timedelta(days=90)
+    with profiler.stage("simulate_history") as st:
+        history_data = simulate_history(df_schedule, start_date)
+        st.rows = len(history_data)
+
     # Save to CSV
-    df_history = pd.DataFrame(history_data)
-    output_path = "data/processed/train_delay_history.csv"
-    df_history.to_csv(output_path, index=False)
+    with profiler.stage("save_csv") as st:
+        df_history = pd.DataFrame(history_data)
+        output_path = "data/processed/train_delay_history.csv"
+        df_history.to_csv(output_path, index=False)
+        st.rows = len(df_history)
     print(f"✅ Generated {len(df_history)} rows of training data at {output_path}")
 
     
@@ -91,4 +111,5 @@ def generate_history():
 
 
 if __name__ == "__main__":
-    generate_history()
\ No newline at end of file
+    generate_history()
+    profiler.report()
\ No newline at end of file
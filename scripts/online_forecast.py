@@ -0,0 +1,165 @@
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+
+# --- CONFIGURATION ---
+SEASON = 7
+# Refit when the recent one-step error is this many times the error seen at fit time
+DRIFT_THRESHOLD = float(os.getenv("HW_DRIFT_THRESHOLD", 2.0))
+DRIFT_SPAN = 7  # Days in the moving average of the one-step error
+
+
+def fit_to_state(fit, values):
+    """
+    Pulls what we need to keep forecasting out of a fitted ExponentialSmoothing
+    (trend='add', seasonal='add'): final level/trend, the next SEASON seasonal
+    terms, the smoothing parameters and the in-sample mean absolute error.
+    """
+    season = np.asarray(fit.season)
+    return {
+        "level": float(np.asarray(fit.level)[-1]),
+        "trend": float(np.asarray(fit.trend)[-1]),
+        "season": season[-SEASON:].astype(float),  # season[0] applies to the next day
+        "alpha": float(fit.params['smoothing_level']),
+        "beta": float(fit.params['smoothing_trend']),
+        "gamma": float(fit.params['smoothing_seasonal']),
+        "mae": float(np.mean(np.abs(np.asarray(values) - np.asarray(fit.fittedvalues)))),
+    }
+
+
+def seasonal_naive_state(values):
+    """
+    State that reproduces a seasonal-naive forecast (repeat last week) under the same
+    update equations: level/trend stay 0 (alpha = beta = 0) and gamma = 1 makes each
+    new observation the new seasonal term.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) >= SEASON:
+        season = values[-SEASON:]
+        mae = float(np.mean(np.abs(values[SEASON:] - values[:-SEASON]))) if len(values) > SEASON else 0.0
+    else:
+        season = np.full(SEASON, values.mean() if len(values) else 0.0)
+        mae = 0.0
+    return {"level": 0.0, "trend": 0.0, "season": season, "alpha": 0.0, "beta": 0.0, "gamma": 1.0, "mae": mae}
+
+
+def history_fingerprint(history):
+    """Hash of a daily history (Series or days x series DataFrame): its dates and values."""
+    h = hashlib.sha1(np.asarray(history.index.values, dtype='datetime64[D]').tobytes())
+    h.update(np.ascontiguousarray(np.round(np.asarray(history, dtype=float), 6)).tobytes())
+    return h.hexdigest()[:16]
+
+
+class HoltWintersState:
+    """
+    Additive Holt-Winters state for many series at once, stored as flat NumPy arrays.
+
+    update() folds in one new day for every series with a handful of vector
+    operations (no refit), forecast() rebuilds the horizon from the state. The
+    recursions are the ones statsmodels uses, so an update gives the same numbers
+    as re-running the fitted model over the longer series with fixed parameters.
+    """
+
+    FIELDS = ("level", "trend", "season", "alpha", "beta", "gamma", "base_mae", "recent_mae")
+
+    def __init__(self, names, last_date, level, trend, season, alpha, beta, gamma,
+                 base_mae, recent_mae=None, extra=None):
+        self.names = np.asarray(names, dtype=str)
+        self.last_date = pd.Timestamp(last_date)
+        self.level = np.asarray(level, dtype=float)
+        self.trend = np.asarray(trend, dtype=float)
+        self.season = np.asarray(season, dtype=float).reshape(len(self.names), SEASON)
+        self.alpha = np.asarray(alpha, dtype=float)
+        self.beta = np.asarray(beta, dtype=float)
+        self.gamma = np.asarray(gamma, dtype=float)
+        self.base_mae = np.asarray(base_mae, dtype=float)
+        self.recent_mae = self.base_mae.copy() if recent_mae is None else np.asarray(recent_mae, dtype=float)
+        # Any other string arrays the caller wants saved alongside (e.g. hierarchy layout)
+        self.extra = {k: np.asarray(v, dtype=str) for k, v in (extra or {}).items()}
+
+    @classmethod
+    def from_states(cls, names, states, last_date, extra=None):
+        """Builds the batch from per-series dicts (see fit_to_state / seasonal_naive_state)."""
+        return cls(
+            names, last_date,
+            level=[s["level"] for s in states],
+            trend=[s["trend"] for s in states],
+            season=np.vstack([s["season"] for s in states]),
+            alpha=[s["alpha"] for s in states],
+            beta=[s["beta"] for s in states],
+            gamma=[s["gamma"] for s in states],
+            base_mae=[s["mae"] for s in states],
+            extra=extra,
+        )
+
+    def update(self, y, day=None):
+        """Folds in one day of observations (one value per series)."""
+        y = np.asarray(y, dtype=float)
+        s_old = self.season[:, 0]
+
+        # One-step error feeds the drift check
+        error = np.abs(y - (self.level + self.trend + s_old))
+        k = 2.0 / (DRIFT_SPAN + 1)
+        self.recent_mae = (1 - k) * self.recent_mae + k * error
+
+        level = self.alpha * (y - s_old) + (1 - self.alpha) * (self.level + self.trend)
+        trend = self.beta * (level - self.level) + (1 - self.beta) * self.trend
+        s_new = self.gamma * (y - self.level - self.trend) + (1 - self.gamma) * s_old
+
+        self.level, self.trend = level, trend
+        self.season = np.column_stack([self.season[:, 1:], s_new])
+        self.last_date = pd.Timestamp(day) if day is not None else self.last_date + pd.Timedelta(days=1)
+
+    def update_many(self, daily):
+        """Folds in a (days x series) DataFrame, indexed by date, in date order."""
+        for day, row in daily.sort_index().iterrows():
+            self.update(row.to_numpy(), day)
+
+    def forecast(self, horizon):
+        """(n_series, horizon) forecast from the current state."""
+        steps = np.arange(1, horizon + 1)
+        seasonal = self.season[:, (steps - 1) % SEASON]
+        return self.level[:, None] + self.trend[:, None] * steps[None, :] + seasonal
+
+    def replace(self, positions, states):
+        """Splices refitted per-series states (fit_to_state dicts) in at the given positions."""
+        for i, s in zip(positions, states):
+            self.level[i], self.trend[i], self.season[i] = s["level"], s["trend"], s["season"]
+            self.alpha[i], self.beta[i], self.gamma[i] = s["alpha"], s["beta"], s["gamma"]
+            self.base_mae[i] = self.recent_mae[i] = s["mae"]
+
+    def stamp(self, history):
+        """Records which data the state has seen: the fingerprint of `history` up to last_date."""
+        seen = history[history.index <= self.last_date]
+        self.extra["history_hash"] = np.asarray(history_fingerprint(seen), dtype=str)
+
+    def fitted_on(self, history):
+        """
+        False when the part of `history` up to last_date is not the data this state was
+        built from (the CSV was regenerated, or the state predates fingerprints), so
+        folding new days into it would continue a series that no longer exists.
+        """
+        if "history_hash" not in self.extra:
+            return False
+        seen = history[history.index <= self.last_date]
+        return str(self.extra["history_hash"]) == history_fingerprint(seen)
+
+    def needs_refit(self, threshold=DRIFT_THRESHOLD):
+        """Series whose recent one-step error has drifted well above the fit-time error."""
+        return self.recent_mae > threshold * np.maximum(self.base_mae, 1e-9)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        arrays = {f: getattr(self, f) for f in self.FIELDS}
+        extra = {f"extra_{k}": v for k, v in self.extra.items()}
+        np.savez(path, names=self.names, last_date=str(self.last_date.date()), **arrays, **extra)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            extra = {k[len("extra_"):]: data[k] for k in data.files if k.startswith("extra_")}
+            return cls(
+                data["names"], str(data["last_date"]),
+                **{f: data[f] for f in cls.FIELDS}, extra=extra,
+            )
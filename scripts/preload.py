@@ -0,0 +1,130 @@
+import os
+import gc
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# --- CONFIGURATION ---
+PRELOAD = os.getenv("RAILWAY_PRELOAD", "0") == "1"
+MASTER_PID_ENV = "RAILWAY_MASTER_PID"  # Set by gunicorn.conf.py so any worker can find its siblings
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def preload_artifacts():
+    """
+    Loads every read-only serving artifact once, in the gunicorn master (preload_app),
+    before the workers fork:
+      - BM25 postings: memory-mapped .npy files (page cache, shared by construction)
+      - compact vector store: memory-mapped vectors.npy
+      - query encoder weights: tensor storage, shared copy-on-write after fork
+    Only that array data stays shared. The BM25 texts, metadata and term dict are ordinary
+    Python objects: every access updates their refcounts, which copies the touched pages
+    into the worker, so over time each worker holds its own copy of them (small next to
+    the model weights).
+    The agent is not loaded here: its Gemini clients are built in each worker (api.get_agent).
+    The Chroma client is NOT preloaded: its SQLite handles and threads are not fork-safe,
+    so preload mode should run with RAG_VECTOR_BACKEND=compact.
+    Finishes with gc.freeze() so the workers' cyclic garbage collector doesn't also write
+    to those pages.
+    """
+    from scripts.bm25_index import INDEX_PATH
+    from scripts.rules_retriever import VECTOR_BACKEND, COMPACT_DIR, bm25_index, vector_store
+    from scripts.query_encoder import load_query_embeddings
+
+    loaded = {}
+    t0 = time.perf_counter()
+    if os.path.exists(INDEX_PATH):
+        loaded["bm25_chunks"] = len(bm25_index().ids)
+    if VECTOR_BACKEND == "compact" and os.path.exists(COMPACT_DIR):
+        loaded["compact_vectors"] = len(vector_store())  # Also loads the query encoder
+    else:
+        print("   ⚠️ Chroma backend is opened per worker (not fork-safe); use RAG_VECTOR_BACKEND=compact to share it.")
+        load_query_embeddings()
+    loaded["query_encoder"] = type(load_query_embeddings()).__name__
+    loaded["load_s"] = round(time.perf_counter() - t0, 2)
+
+    gc.collect()
+    gc.freeze()
+    return loaded
+
+
+def memory_report(pid="self"):
+    """Rss/Pss/Shared/Private (MB) of one process from /proc/<pid>/smaps_rollup (Linux 4.14+)."""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in SMAPS_FIELDS:
+                    values[name] = int(rest.split()[0]) / 1024
+    except OSError:
+        # Older kernels / other OS: RSS only, no sharing breakdown
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        values["Rss"] = int(line.split()[1]) / 1024
+        except OSError:
+            return None
+    report = {k.lower() + "_mb": round(v, 1) for k, v in values.items()}
+    if "Private_Clean" in values:
+        # USS: what the OS gets back if this process exits = the real cost of one more worker
+        report["uss_mb"] = round(values["Private_Clean"] + values["Private_Dirty"], 1)
+    report["pid"] = os.getpid() if pid == "self" else int(pid)
+    return report
+
+
+def _children(parent_pid):
+    pids = []
+    if not os.path.isdir("/proc"):
+        return pids  # No procfs (macOS): the master's report only
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # Field 4 is the parent PID; the command name (field 2) may contain spaces, so split after ")"
+        if int(stat.rsplit(")", 1)[1].split()[1]) == parent_pid:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def worker_memory(master_pid=None):
+    """
+    Memory of the gunicorn master and every worker. Pss splits shared pages between
+    the processes using them, so the Pss total is the real footprint of the service,
+    and a worker's USS is what adding one more costs.
+    """
+    master_pid = master_pid or int(os.getenv(MASTER_PID_ENV, 0))
+    if not master_pid:
+        return {"workers": [memory_report()], "note": "Not running under gunicorn; this process only."}
+
+    master = memory_report(master_pid)
+    workers = [r for r in (memory_report(pid) for pid in _children(master_pid)) if r]
+    processes = [r for r in [master] + workers if r]
+    return {
+        "master": master,
+        "workers": workers,
+        "total_rss_mb": round(sum(r.get("rss_mb", 0) for r in processes), 1),
+        "total_pss_mb": round(sum(r.get("pss_mb", 0) for r in processes), 1),
+        "avg_worker_uss_mb": round(sum(r.get("uss_mb", 0) for r in workers) / len(workers), 1) if workers else None,
+    }
+
+
+if __name__ == "__main__":
+    # python scripts/preload.py <gunicorn master pid>
+    if len(sys.argv) < 2:
+        print("Usage: python scripts/preload.py <master_pid>")
+        sys.exit(1)
+    report = worker_memory(int(sys.argv[1]))
+    print(f"{'pid':>8} {'rss':>8} {'pss':>8} {'shared':>8} {'uss':>8}  (MB)")
+    for role, r in [("master", report["master"])] + [("worker", w) for w in report["workers"]]:
+        shared = r.get("shared_clean_mb", 0) + r.get("shared_dirty_mb", 0)
+        print(f"{r['pid']:>8} {r.get('rss_mb', 0):>8.1f} {r.get('pss_mb', 0):>8.1f} {shared:>8.1f} "
+              f"{r.get('uss_mb', 0):>8.1f}  {role}")
+    print(f"Total RSS {report['total_rss_mb']} MB | total PSS {report['total_pss_mb']} MB | "
+          f"avg worker USS {report['avg_worker_uss_mb']} MB")
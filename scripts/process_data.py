@@ -1,8 +1,12 @@
 import pandas as pd
 import json
 import os
+import sys
 import requests
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.profiling import Profiler
+
 # --- CONFIGURATION ---
 BASE_DIR = "data"
 RAW_STATIC_DIR = os.path.join(BASE_DIR, "raw","static")
@@ -70,6 +74,7 @@ def process_stations():
         output_path = os.path.join(PROCESSED_DIR, "clean_stations.csv")
         df.to_csv(output_path, index=False)
         print(f"   ✅ Success! Saved {len(df)} stations to {output_path}")
+        return len(df)
         
     except Exception as e:
         print(f"   ❌ Station Processing Error: {e}")
@@ -132,11 +137,18 @@ def process_schedules():
         output_path = os.path.join(PROCESSED_DIR, "clean_schedules.csv")
         df.to_csv(output_path, index=False)
         print(f"   ✅ Success! Saved {len(df)} schedule rows to {output_path}")
+        return len(df)
 
     except Exception as e:
         print(f"   ❌ Schedule Error: {e}")
 
 if __name__ == "__main__":
-    download_station_data()
-    process_stations()
-    process_schedules()
\ No newline at end of file
+    # PROFILE=1 (or --profile) writes per-stage timings to docs/profiles/
+    profiler = Profiler("process_data")
+    with profiler.stage("download_stations"):
+        download_station_data()
+    with profiler.stage("process_stations") as st:
+        st.rows = process_stations()
+    with profiler.stage("process_schedules") as st:
+        st.rows = process_schedules()
+    profiler.report()
\ No newline at end of file
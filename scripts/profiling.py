@@ -0,0 +1,318 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import platform
+import threading
+from collections import Counter
+from datetime import datetime
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+# --- CONFIGURATION ---
+# Turn on with PROFILE=1 or `--profile` on the command line of any pipeline script
+PROFILE_ENABLED = os.getenv("PROFILE", "0") == "1" or "--profile" in sys.argv
+PROFILE_MODE = os.getenv("PROFILE_MODE", "")        # "" (timings only), "cprofile" or "sample"
+PROFILE_STAGE = os.getenv("PROFILE_STAGE", "")      # Only profile this stage (default: keep the hottest)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "docs/profiles")
+SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_MS", 5))
+TOP_FUNCTIONS = 25
+REGRESSION_THRESHOLD = 0.2  # A stage 20% slower than the previous run is flagged
+
+
+def _status_kb(field):
+    """A field of /proc/self/status (VmRSS, VmHWM) in kB, or None off Linux."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """Resets VmHWM so the next reading is the peak of this stage only (Linux >= 4.0)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _windows_memory_mb():
+    """(current, peak) working set of this process on Windows, via psapi (no psutil needed)."""
+    import ctypes
+    from ctypes import wintypes
+
+    class Counters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    counters = Counters()
+    counters.cb = ctypes.sizeof(Counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return None, None
+    return counters.WorkingSetSize / 1024 ** 2, counters.PeakWorkingSetSize / 1024 ** 2
+
+
+def _peak_rss_mb():
+    peak = _status_kb("VmHWM")
+    if peak is not None:
+        return peak / 1024
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024  # bytes on macOS
+    if sys.platform == "win32":
+        return _windows_memory_mb()[1]
+    return _rss_mb()
+
+
+def _rss_mb():
+    rss = _status_kb("VmRSS")
+    if rss is not None:
+        return rss / 1024
+    if sys.platform == "win32":
+        return _windows_memory_mb()[0]
+    return None
+
+
+def _children_cpu_s():
+    """CPU time of finished child processes; not available on Windows."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _round(value, digits=1):
+    return round(value, digits) if value is not None else None
+
+
+class StackSampler:
+    """Low-overhead sampling profiler: snapshots the main thread's stack every few ms."""
+
+    def __init__(self, interval_ms=SAMPLE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.own = Counter()        # Samples with the function on top of the stack
+        self.inclusive = Counter()  # Samples with the function anywhere on the stack
+        self.samples = 0
+        self._target = threading.main_thread().ident
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.own[self._key(frame)] += 1
+            seen = set()
+            while frame is not None:
+                seen.add(self._key(frame))
+                frame = frame.f_back
+            self.inclusive.update(seen)
+
+    @staticmethod
+    def _key(frame):
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})"
+
+    def enable(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name="stack-sampler")
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        self._thread.join()
+
+    def top(self, n=TOP_FUNCTIONS):
+        total = max(self.samples, 1)
+        return [{"function": fn, "inclusive_pct": round(100 * count / total, 1),
+                 "own_pct": round(100 * self.own[fn] / total, 1)}
+                for fn, count in self.inclusive.most_common(n)]
+
+
+def _cprofile_top(prof, n=TOP_FUNCTIONS):
+    stats = pstats.Stats(prof)
+    rows = []
+    for (filename, line, name), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({"function": f"{os.path.basename(filename)}:{line}({name})",
+                     "calls": nc, "own_s": round(tt, 4), "cumulative_s": round(ct, 4)})
+    return sorted(rows, key=lambda r: r["cumulative_s"], reverse=True)[:n]
+
+
+class Stage:
+    """One named step. Set `rows` inside the block to get rows/sec in the report."""
+
+    def __init__(self, name, profiler):
+        self.name = name
+        self.rows = None
+        self._profiler = profiler
+        self._tracer = None
+
+    def __enter__(self):
+        p = self._profiler
+        if p.mode and (not PROFILE_STAGE or PROFILE_STAGE == self.name):
+            self._tracer = cProfile.Profile() if p.mode == "cprofile" else StackSampler()
+        self.rss_start = _rss_mb()
+        self.peak_is_stage = _reset_peak_rss()
+        self.cpu0 = time.process_time()
+        self.child0 = _children_cpu_s()
+        self.wall0 = time.perf_counter()
+        if self._tracer:
+            self._tracer.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._tracer:
+            self._tracer.disable()
+        wall = time.perf_counter() - self.wall0
+        child = _children_cpu_s()
+        record = {
+            "name": self.name,
+            "wall_s": round(wall, 4),
+            "cpu_s": round(time.process_time() - self.cpu0, 4),
+            # Worker processes (e.g. ProcessPoolExecutor) that finished during the stage
+            "child_cpu_s": _round(child - self.child0, 4) if child is not None else None,
+            "peak_rss_mb": _round(_peak_rss_mb()),
+            "peak_rss_scope": "stage" if self.peak_is_stage else "process",
+            "rss_start_mb": _round(self.rss_start),
+            "rss_end_mb": _round(_rss_mb()),
+            "rows": self.rows,
+            "rows_per_sec": round(self.rows / wall, 1) if self.rows and wall > 0 else None,
+        }
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        self._profiler._finish(record, self._tracer)
+        return False
+
+
+class _NoopStage:
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class Profiler:
+    """
+    Per-stage wall time, CPU time, peak RSS and rows for a pipeline script:
+
+        profiler = Profiler("train_model")
+        with profiler.stage("train") as st:
+            model.fit(X, y)
+            st.rows = len(X)
+        profiler.report()
+
+    Does nothing unless PROFILE=1 / --profile. PROFILE_MODE=cprofile|sample adds a
+    function-level profile of the hottest stage (or of PROFILE_STAGE) to the report.
+    """
+
+    def __init__(self, script, enabled=None, mode=None):
+        self.script = script
+        self.enabled = PROFILE_ENABLED if enabled is None else enabled
+        self.mode = (PROFILE_MODE if mode is None else mode) if self.enabled else ""
+        self.stages = []
+        self._tracers = {}
+        self.started_at = datetime.now()
+        self._wall0 = time.perf_counter()
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NoopStage()
+        return Stage(name, self)
+
+    def _finish(self, record, tracer):
+        self.stages.append(record)
+        if tracer is not None:
+            self._tracers[record["name"]] = tracer
+        rows = f", {record['rows']:,} rows" if record["rows"] else ""
+        peak = f", peak {record['peak_rss_mb']:.0f} MB" if record["peak_rss_mb"] is not None else ""
+        print(f"   ⏱️ [{record['name']}] {record['wall_s']:.2f}s wall, {record['cpu_s']:.2f}s CPU{peak}{rows}")
+
+    def report(self):
+        """Writes docs/profiles/<script>_<timestamp>.json and appends a line to history.jsonl."""
+        if not self.enabled or not self.stages:
+            return None
+        hottest = max(self.stages, key=lambda s: s["wall_s"])
+        report = {
+            "script": self.script,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "total_wall_s": round(time.perf_counter() - self._wall0, 4),
+            # Per-stage peaks reset VmHWM, so the run's peak is the largest of them
+            "peak_rss_mb": max((s["peak_rss_mb"] for s in self.stages if s["peak_rss_mb"] is not None), default=None),
+            "hottest_stage": hottest["name"],
+            "stages": self.stages,
+        }
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, f"{self.script}_{self.started_at:%Y%m%d-%H%M%S}")
+
+        profiled = PROFILE_STAGE if PROFILE_STAGE in self._tracers else hottest["name"]
+        tracer = self._tracers.get(profiled)
+        if isinstance(tracer, cProfile.Profile):
+            tracer.dump_stats(base + ".prof")  # Open with snakeviz / pstats for the full call graph
+            report["profile"] = {"stage": profiled, "mode": "cprofile", "file": base + ".prof",
+                                 "top": _cprofile_top(tracer)}
+        elif isinstance(tracer, StackSampler):
+            report["profile"] = {"stage": profiled, "mode": "sample", "samples": tracer.samples,
+                                 "interval_ms": SAMPLE_INTERVAL_MS, "top": tracer.top()}
+
+        with open(base + ".json", "w") as f:
+            json.dump(report, f, indent=2)
+        summary = {k: report[k] for k in ("script", "started_at", "total_wall_s", "peak_rss_mb")}
+        summary["stages"] = {s["name"]: s["wall_s"] for s in self.stages}
+        with open(os.path.join(PROFILE_DIR, "history.jsonl"), "a") as f:
+            f.write(json.dumps(summary) + "\n")
+
+        print(f"   📈 Profile saved to {base}.json (hottest stage: {hottest['name']}, {hottest['wall_s']:.2f}s)")
+        return report
+
+
+def compare_runs(profile_dir=PROFILE_DIR, threshold=REGRESSION_THRESHOLD):
+    """Latest vs previous run of every script in history.jsonl; flags stages that got slower."""
+    path = os.path.join(profile_dir, "history.jsonl")
+    if not os.path.exists(path):
+        print(f"❌ No profiles yet in {profile_dir}. Run a script with PROFILE=1 first.")
+        return {}
+    runs = {}
+    with open(path) as f:
+        for line in f:
+            run = json.loads(line)
+            runs.setdefault(run["script"], []).append(run)
+
+    regressions = {}
+    for script, history in sorted(runs.items()):
+        latest = history[-1]
+        if len(history) < 2:
+            print(f"{script}: {latest['total_wall_s']:.2f}s (first run)")
+            continue
+        previous = history[-2]
+        print(f"{script}: {previous['total_wall_s']:.2f}s -> {latest['total_wall_s']:.2f}s")
+        for stage, wall in latest["stages"].items():
+            before = previous["stages"].get(stage)
+            if before and wall > before * (1 + threshold) and wall - before > 0.05:
+                regressions.setdefault(script, []).append(stage)
+                print(f"   ⚠️ {stage}: {before:.2f}s -> {wall:.2f}s (+{100 * (wall / before - 1):.0f}%)")
+    return regressions
+
+
+if __name__ == "__main__":
+    compare_runs()
@@ -0,0 +1,220 @@
+import os
+import time
+import queue
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from functools import lru_cache
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from scripts.embedding_cache import EMBED_MODEL, QUERY_CACHE_SIZE, load_embeddings
+from scripts.tracing import span
+
+# --- CONFIGURATION ---
+ENCODER_THREADS = int(os.getenv("EMBED_THREADS", os.cpu_count() or 1))
+QUANTIZE = os.getenv("EMBED_QUANTIZE", "0") == "1"  # int8 dynamic quantization of the Linear layers
+MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", 32))     # Queries coalesced into one forward pass
+MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", 5))  # Longest wait for queries already on their way
+PARITY_MIN_COSINE = 0.99  # The quantized model must agree with the original at least this well
+
+PARITY_SENTENCES = [
+    "What is the refund for cancelling a tatkal ticket?",
+    "Can I carry extra luggage in AC 2 tier?",
+    "How do I file a TDR if the train is late by more than three hours?",
+    "Penalty for travelling without a ticket",
+    "Is RAC converted to a berth after chart preparation?",
+    "senior citizen concession rules",
+]
+
+
+def parity_check(original, candidate, sentences=PARITY_SENTENCES):
+    """Lowest cosine similarity between the two models' embeddings over the sample sentences."""
+    a = original.encode(sentences, convert_to_numpy=True)
+    b = candidate.encode(sentences, convert_to_numpy=True)
+    cos = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    return float(cos.min())
+
+
+class CPUQueryEncoder(Embeddings):
+    """
+    Query embeddings for CPU-only serving:
+      - torch thread count set explicitly (EMBED_THREADS)
+      - concurrent embed_query() calls are coalesced into one batch by a background thread
+      - optional int8 dynamic quantization, kept only if it passes the parity check
+      - LRU cache of recent query vectors
+    Produces the same vectors as the build (same model, no normalisation), so it can
+    query the existing Chroma / compact stores.
+    """
+
+    def __init__(self, model_name=EMBED_MODEL, threads=ENCODER_THREADS, quantize=QUANTIZE,
+                 max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, cache_size=QUERY_CACHE_SIZE):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        torch.set_num_threads(threads)
+        self.threads = threads
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.model.eval()
+        self.quantized = False
+        self.parity = None
+
+        if quantize:
+            candidate = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+            self.parity = parity_check(self.model, candidate)
+            if self.parity >= PARITY_MIN_COSINE:
+                self.model, self.quantized = candidate, True
+                print(f"   ✅ Using int8 query encoder (parity cosine {self.parity:.4f})")
+            else:
+                print(f"   ⚠️ Quantized encoder failed parity ({self.parity:.4f} < {PARITY_MIN_COSINE}), keeping float32")
+
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._worker_pid = None  # Batch thread is started lazily, so the encoder survives fork()
+        self._start_lock = threading.Lock()
+        self._pending = 0  # Cache misses announced but not yet taken into a batch
+
+        # --- METRICS ---
+        self.latencies_ms = deque(maxlen=10_000)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.batches = 0
+        self.batched_queries = 0
+
+    def _ensure_batch_thread(self):
+        """
+        Threads don't survive fork(): when the model was preloaded in a parent process
+        (see preload.py) each worker starts its own batching thread and queue here.
+        """
+        if self._worker_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._worker_pid != os.getpid():
+                self._queue = queue.Queue()
+                threading.Thread(target=self._batch_loop, daemon=True, name="query-encoder").start()
+                self._worker_pid = os.getpid()
+
+    def _encode(self, texts):
+        import torch
+        with torch.inference_mode():
+            return self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+
+    def _batch_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            self._taken(1)
+            # Only wait for queries that are already on their way: a lone query is encoded at
+            # once, and requests that arrive while the model is busy queue up for the next batch
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch and self._pending > 0:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                    self._taken(1)
+                except queue.Empty:
+                    break
+
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = dict(zip(texts, self._encode(texts)))
+                for text, future in batch:
+                    future.set_result(vectors[text])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            self.batches += 1
+            self.batched_queries += len(batch)
+
+    def _taken(self, n):
+        with self._cache_lock:
+            self._pending -= n
+
+    def embed_query(self, text):
+        t0 = time.perf_counter()
+        with self._cache_lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+                self._pending += 1
+
+        if vector is None:
+            self._ensure_batch_thread()
+            future = Future()
+            self._queue.put((text, future))
+            with span("embedding", "query_encoder"):
+                vector = future.result().tolist()
+            with self._cache_lock:
+                self._cache[text] = vector
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        self.latencies_ms.append((time.perf_counter() - t0) * 1000)
+        return list(vector)
+
+    def clear_query_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    def embed_documents(self, texts):
+        # Bulk path (no coalescing needed); documents are normally embedded by build_rag_db.py
+        return self._encode(list(texts)).tolist()
+
+    def metrics(self):
+        lat = np.asarray(self.latencies_ms) if self.latencies_ms else np.zeros(1)
+        return {
+            "queries": len(self.latencies_ms),
+            "latency_ms_p50": round(float(np.percentile(lat, 50)), 3),
+            "latency_ms_p95": round(float(np.percentile(lat, 95)), 3),
+            "latency_ms_mean": round(float(lat.mean()), 3),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "batches": self.batches,
+            "avg_batch_size": round(self.batched_queries / self.batches, 2) if self.batches else 0.0,
+            "threads": self.threads,
+            "quantized": self.quantized,
+            "parity_cosine": self.parity,
+        }
+
+
+@lru_cache(maxsize=1)
+def load_query_embeddings():
+    """
+    Embedding function for the query path. On CPU-only hosts (production) this is the
+    CPUQueryEncoder; with a GPU the cached HuggingFace embeddings are used as before.
+    EMBED_SERVING=cpu / default forces one or the other.
+    """
+    mode = os.getenv("EMBED_SERVING")
+    if mode is None:
+        import torch
+        mode = "default" if torch.cuda.is_available() else "cpu"
+    return CPUQueryEncoder() if mode == "cpu" else load_embeddings()
+
+
+def query_model_loaded():
+    """True once the query embedding model itself is in memory (CachedEmbeddings loads it lazily)."""
+    if load_query_embeddings.cache_info().currsize == 0:
+        return False
+    encoder = load_query_embeddings()
+    return encoder.model is not None if isinstance(encoder, CPUQueryEncoder) else encoder._model is not None
+
+
+def clear_query_caches():
+    """Drops the cached query vectors, so the next queries are really embedded (benchmarks)."""
+    if load_query_embeddings.cache_info().currsize:
+        load_query_embeddings().clear_query_cache()
+
+
+def query_encoder_metrics():
+    """Metrics of the serving encoder, or None if it hasn't been loaded (or isn't the CPU one)."""
+    if load_query_embeddings.cache_info().currsize == 0:
+        return None
+    encoder = load_query_embeddings()
+    return encoder.metrics() if isinstance(encoder, CPUQueryEncoder) else None
@@ -0,0 +1,126 @@
+import os
+import re
+from functools import lru_cache
+from typing import Any, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from scripts.bm25_index import INDEX_PATH, ARRAYS_DIR, BM25Index, tokenize
+from scripts.context_builder import CONTEXT_CANDIDATES, BudgetedRetriever
+from scripts.tracing import span
+
+# --- CONFIGURATION ---
+CHROMA_PATH = "chroma_db"
+COMPACT_DIR = os.path.join(CHROMA_PATH, "compact")
+# vector = dense only (old behaviour), lexical = BM25 only (no embedding model),
+# hybrid = both fused by rank (default), auto = lexical for keyword-style questions, hybrid
+# otherwise (opt-in until docs/retrieval_evaluation.json shows it matches hybrid's recall)
+RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "hybrid")
+# chroma = persistent Chroma client (HNSW), compact = memory-mapped matrix + exact search
+VECTOR_BACKEND = os.getenv("RAG_VECTOR_BACKEND", "chroma")
+TOP_K = 3
+FUSION_CANDIDATES = 10  # Results taken from each retriever before fusing
+RRF_K = 60              # Standard reciprocal-rank-fusion constant
+
+
+def _doc_key(doc):
+    return (doc.metadata.get("source"), doc.metadata.get("page"), doc.page_content)
+
+
+def reciprocal_rank_fusion(result_lists, k=TOP_K, rrf_k=RRF_K):
+    """Merges ranked lists: score = sum of 1 / (rrf_k + rank) over the lists a chunk appears in."""
+    scores, docs = {}, {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [docs[key] for key in ranked[:k]]
+
+
+def lexical_search(index, query, k):
+    with span("lexical_search", "bm25"):
+        return index.search_documents(query, k)
+
+
+def dense_search(query, k):
+    # Includes embedding the query (traced separately as an "embedding" span)
+    with span("vector_search", VECTOR_BACKEND):
+        return vector_store().similarity_search(query, k=k)
+
+
+def is_keyword_query(query):
+    """Short questions or ones with acronyms like TDR / RAC are best answered lexically."""
+    return len(tokenize(query)) <= 3 or re.search(r"\b[A-Z]{2,}\b", query) is not None
+
+
+class BM25Retriever(BaseRetriever):
+    index: Any
+    k: int = TOP_K
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return lexical_search(self.index, query, self.k)
+
+
+class DenseRetriever(BaseRetriever):
+    k: int = TOP_K
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return dense_search(query, self.k)
+
+
+class HybridRetriever(BaseRetriever):
+    """BM25 + dense search fused by rank. In 'auto' mode keyword queries skip the dense half."""
+    index: Any
+    k: int = TOP_K
+    auto: bool = False
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        lexical = lexical_search(self.index, query, FUSION_CANDIDATES)
+        if self.auto and is_keyword_query(query):
+            return lexical[:self.k]
+        dense = dense_search(query, FUSION_CANDIDATES)
+        return reciprocal_rank_fusion([lexical, dense], k=self.k)
+
+
+@lru_cache(maxsize=1)
+def vector_store():
+    """Vector backend + embedding model, loaded on first use only (lexical queries never need it)."""
+    from scripts.query_encoder import load_query_embeddings
+    if VECTOR_BACKEND == "compact" and os.path.exists(COMPACT_DIR):
+        from scripts.compact_store import CompactVectorStore
+        return CompactVectorStore(embedding_function=load_query_embeddings())
+    from langchain_community.vectorstores import Chroma
+    return Chroma(persist_directory=CHROMA_PATH, embedding_function=load_query_embeddings())
+
+
+@lru_cache(maxsize=1)
+def bm25_index():
+    # Memory-mapped postings (shared by all API workers) unless they are older than the JSON
+    offsets = os.path.join(ARRAYS_DIR, "offsets.npy")
+    if os.path.exists(offsets) and os.path.getmtime(offsets) >= os.path.getmtime(INDEX_PATH):
+        return BM25Index.load_arrays(ARRAYS_DIR)
+    return BM25Index.load(INDEX_PATH)
+
+
+def get_rules_retriever(mode=None, k=TOP_K, budgeted=True):
+    """
+    The retriever used by query_rules and chat_with_data.py. With budgeted=True it pulls
+    CONTEXT_CANDIDATES hits and returns them merged/deduplicated within the token budget
+    (see context_builder.py); budgeted=False returns the raw top-k chunks.
+    """
+    if budgeted:
+        return BudgetedRetriever(base=get_rules_retriever(mode, max(k, CONTEXT_CANDIDATES), budgeted=False),
+                                 baseline_k=k)
+
+    mode = mode or RETRIEVAL_MODE
+    if mode == "vector" or not os.path.exists(INDEX_PATH):
+        # No BM25 index yet (build_rag_db.py not re-run): fall back to dense search
+        return DenseRetriever(k=k)
+    if mode == "lexical":
+        return BM25Retriever(index=bm25_index(), k=k)
+    if mode in ("hybrid", "auto"):
+        return HybridRetriever(index=bm25_index(), k=k, auto=(mode == "auto"))
+    raise ValueError(f"Unknown RAG_RETRIEVAL_MODE: {mode}")
@@ -0,0 +1,381 @@
+import os
+import time
+import json
+import uuid
+import sqlite3
+import threading
+import contextvars
+from collections import deque
+from langchain_core.callbacks import BaseCallbackHandler
+
+# --- CONFIGURATION ---
+TRACING_ENABLED = os.getenv("RAILWAY_TRACING", "0") == "1"
+TRACE_LOG = os.getenv("RAILWAY_TRACE_LOG", "0") == "1"  # Also print each finished trace as one JSON line
+TRACE_HEADER = "X-Trace-Id"
+RECENT_TRACES = 200
+# Set by gunicorn.conf.py: each worker publishes its metrics and finished traces here, so
+# whichever worker answers /metrics or /traces/<id> sees all of them. Unset: this process only.
+METRICS_DIR = os.getenv("RAILWAY_METRICS_DIR")
+# Seconds; covers a sub-ms SQLite lookup up to a slow multi-step Gemini conversation
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_trace = contextvars.ContextVar("trace", default=None)
+recent_traces = deque(maxlen=RECENT_TRACES)
+
+
+class Histogram:
+    """Minimal Prometheus histogram (cumulative buckets, _sum, _count) keyed by label values."""
+
+    def __init__(self, name, help, label_names, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), list(s["counts"]), s["sum"], s["count"]] for labels, s in self._series.items()]
+
+    def render(self, snapshots=None):
+        """Own series, or the sum of several processes' snapshot() lists."""
+        merged = {}
+        for snapshot in snapshots if snapshots is not None else [self.snapshot()]:
+            for labels, counts, total, count in snapshot:
+                series = merged.setdefault(tuple(labels), {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+                series["counts"] = [a + b for a, b in zip(series["counts"], counts)]
+                series["sum"] += total
+                series["count"] += count
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(merged.items()):
+            base = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {series["count"]}')
+            lines.append(f"{self.name}_sum{{{base}}} {series['sum']:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {series['count']}")
+        return lines
+
+
+class Counter:
+    """Minimal Prometheus counter keyed by label values."""
+
+    def __init__(self, name, help, label_names):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    def render(self, snapshots=None):
+        """Own values, or the sum of several processes' snapshot() lists."""
+        merged = {}
+        for snapshot in snapshots if snapshots is not None else [self.snapshot()]:
+            for labels, value in snapshot:
+                merged[tuple(labels)] = merged.get(tuple(labels), 0) + value
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(merged.items()):
+            base = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, labels))
+            lines.append(f"{self.name}{{{base}}} {value}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+SPAN_SECONDS = Histogram("railway_span_duration_seconds", "Duration of traced operations",
+                         ("kind", "name"))
+LLM_TOKENS = Counter("railway_llm_tokens_total", "Tokens sent to / received from the LLM",
+                     ("model", "direction"))
+
+
+class _NoopSpan:
+    """Returned by span() when tracing is off: entering it costs one attribute lookup."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    def __init__(self, kind, name, attrs):
+        self.kind = kind
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        SPAN_SECONDS.observe(duration, self.kind, self.name)
+        trace = _trace.get()
+        if trace is not None:
+            record = {"kind": self.kind, "name": self.name,
+                      "start_ms": round((self.start - trace["t0"]) * 1000, 2),
+                      "duration_ms": round(duration * 1000, 2), **self.attrs}
+            if exc_type is not None:
+                record["error"] = exc_type.__name__
+            trace["spans"].append(record)  # list.append is atomic, tool threads can share it
+        return False
+
+
+def span(kind, name="", **attrs):
+    """
+    Times a block:  with span("sql", "trains_by_station"): ...
+    kind is the histogram label group (agent, agent_step, tool, llm, sql, embedding,
+    lexical_search, vector_search, retrieval); name says which one.
+    """
+    if not TRACING_ENABLED:
+        return _NOOP
+    return Span(kind, name, attrs)
+
+
+def traced(kind, name):
+    """Decorator form of span(), used for the agent's tool functions."""
+    def wrap(func):
+        if not TRACING_ENABLED:
+            return func
+
+        def inner(*args, **kwargs):
+            with span(kind, name):
+                return func(*args, **kwargs)
+        inner.__name__ = func.__name__
+        inner.__doc__ = func.__doc__
+        return inner
+    return wrap
+
+
+class Trace:
+    """One /chat request: collects its spans and hands out the trace ID for the response header."""
+
+    def __init__(self, trace_id=None, name="chat"):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.name = name
+
+    def __enter__(self):
+        self.data = {"trace_id": self.trace_id, "name": self.name, "t0": time.perf_counter(), "spans": []}
+        self._token = _trace.set(self.data)
+        self._span = span("request", self.name).__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self._span.__exit__(*exc)
+        _trace.reset(self._token)
+        record = {"trace_id": self.trace_id, "name": self.name,
+                  "duration_ms": round((time.perf_counter() - self.data["t0"]) * 1000, 2),
+                  "spans": sorted(self.data["spans"], key=lambda s: s["start_ms"])}
+        recent_traces.append(record)
+        if METRICS_DIR:
+            _store_trace(record)
+        if TRACE_LOG:
+            print(json.dumps(record))
+        return False
+
+
+def start_trace(trace_id=None, name="chat"):
+    """Context manager for a whole request; a no-op (trace_id None) when tracing is off."""
+    if not TRACING_ENABLED:
+        return _NOOP
+    return Trace(trace_id, name)
+
+
+def _store_trace(record):
+    """Shared copy of a finished trace, so /traces/<id> finds it whichever worker answers."""
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(METRICS_DIR, "traces.sqlite"), timeout=5)
+        try:
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS traces (trace_id TEXT PRIMARY KEY, record TEXT)")
+                conn.execute("INSERT OR REPLACE INTO traces VALUES (?, ?)", (record["trace_id"], json.dumps(record)))
+                # Keep the last RECENT_TRACES requests of all workers together
+                conn.execute("DELETE FROM traces WHERE rowid <= (SELECT MAX(rowid) FROM traces) - ?", (RECENT_TRACES,))
+        finally:
+            conn.close()
+    except (OSError, sqlite3.Error) as e:
+        print(f"⚠️ Could not store trace {record['trace_id']}: {e}")
+
+
+def get_trace(trace_id):
+    trace = next((t for t in recent_traces if t["trace_id"] == trace_id), None)
+    if trace is None and METRICS_DIR and os.path.exists(os.path.join(METRICS_DIR, "traces.sqlite")):
+        # Probably recorded by another worker
+        conn = sqlite3.connect(os.path.join(METRICS_DIR, "traces.sqlite"), timeout=5)
+        try:
+            row = conn.execute("SELECT record FROM traces WHERE trace_id = ?", (trace_id,)).fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        finally:
+            conn.close()
+        trace = json.loads(row[0]) if row else None
+    return trace
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """LLM spans with token counts. Attach next to LLM_CALL_COUNTER (callbacks=[...])."""
+
+    def __init__(self):
+        self._open = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        if TRACING_ENABLED:
+            model = (kwargs.get("invocation_params") or {}).get("model") or (serialized or {}).get("name", "llm")
+            self._open[run_id] = span("llm", str(model).replace("models/", "")).__enter__()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.on_llm_start(serialized, [], run_id=run_id, **kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        s = self._open.pop(run_id, None)
+        if s is None:
+            return
+        usage = {}
+        for generations in response.generations:
+            for g in generations:
+                usage = getattr(getattr(g, "message", None), "usage_metadata", None) or usage
+        input_tokens = usage.get("input_tokens", 0)
+        output_tokens = usage.get("output_tokens", 0)
+        LLM_TOKENS.inc(input_tokens, s.name, "input")
+        LLM_TOKENS.inc(output_tokens, s.name, "output")
+        s.set(input_tokens=input_tokens, output_tokens=output_tokens)
+        s.__exit__(None, None, None)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        s = self._open.pop(run_id, None)
+        if s is not None:
+            s.__exit__(type(error), error, None)
+
+
+TRACE_CALLBACK = TracingCallbackHandler()
+
+
+_process_metrics = None  # Callable -> {name: (type, help, value)} of this process's own stats
+
+
+def set_process_metrics(func):
+    """Registers the app's in-process stats (counters/gauges), published with the span metrics."""
+    global _process_metrics
+    _process_metrics = func
+
+
+def _snapshot():
+    return {"pid": os.getpid(), "spans": SPAN_SECONDS.snapshot(), "tokens": LLM_TOKENS.snapshot(),
+            "extra": _process_metrics() if _process_metrics else {}}
+
+
+def flush_metrics():
+    """
+    Publishes this worker's metrics as METRICS_DIR/<pid>.json (after every request and
+    before a scrape), the same idea as prometheus_client's multiprocess mode.
+    """
+    if not METRICS_DIR:
+        return
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(_snapshot(), f)
+        os.replace(path + ".tmp", path)  # Readers never see a half-written file
+    except OSError as e:
+        print(f"⚠️ Could not publish metrics to {METRICS_DIR}: {e}")
+
+
+def _snapshots():
+    """Every worker's published metrics; files of exited workers stay, their counts still happened."""
+    flush_metrics()
+    snapshots = []
+    for name in os.listdir(METRICS_DIR):
+        if name.endswith(".json"):
+            try:
+                with open(os.path.join(METRICS_DIR, name)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return snapshots
+
+
+def _alive(pid):
+    # METRICS_DIR is only set under gunicorn (Unix), where signal 0 just checks the PID
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _metric(name, type, help, value):
+    """value: a number, or {pid: number} for a per-process gauge."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+    if isinstance(value, dict):
+        lines += [f'{name}{{pid="{pid}"}} {v}' for pid, v in sorted(value.items()) if v is not None]
+    else:
+        lines.append(f"{name} {value}")
+    return lines
+
+
+def render_metrics(extra=None):
+    """
+    Prometheus text exposition: span histograms, LLM token counters, the stats registered
+    with set_process_metrics() and `extra` metrics {name: (type, help, value)} computed
+    at scrape time.
+    Under gunicorn (METRICS_DIR) histograms and counters are summed over every worker, so
+    they never jump backwards when the scrape lands on another worker; gauges are per
+    process and carry a pid label (live processes only). Without it: this process only.
+    """
+    snapshots = _snapshots() if METRICS_DIR else [_snapshot()]
+    lines = SPAN_SECONDS.render([s["spans"] for s in snapshots]) + LLM_TOKENS.render([s["tokens"] for s in snapshots])
+
+    merged = {}
+    for snapshot in snapshots:
+        for name, (type, help, value) in snapshot["extra"].items():
+            if value is None:
+                continue
+            if type == "counter":
+                merged[name] = (type, help, merged.get(name, (type, help, 0))[2] + value)
+            elif snapshot["pid"] == os.getpid() or _alive(snapshot["pid"]):
+                merged.setdefault(name, (type, help, {}))[2][snapshot["pid"]] = value
+    merged.update(extra or {})
+
+    for name, (type, help, value) in merged.items():
+        if value is not None:
+            lines += _metric(name, type, help, value)
+    return "\n".join(lines) + "\n"
@@ -6,21 +6,30 @@ from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import mean_absolute_error, r2_score
 import joblib
 import os
+import sys
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.profiling import Profiler
+
 
 # --- CONFIGURATION ---
 DATA_PATH = "data/processed/train_delay_history.csv"
 MODEL_DIR = "models"
 os.makedirs(MODEL_DIR, exist_ok=True)
 
+# PROFILE=1 (or --profile) writes per-stage timings to docs/profiles/
+profiler = Profiler("train_model")
+
 def train_delay_predictor():
     print("1. Loading Data...")
     if not os.path.exists(DATA_PATH):
         print("❌ Error: 'train_delay_history.csv' not found. Run Phase 5 script first.")
         return
 
-    df = pd.read_csv(DATA_PATH)
+    with profiler.stage("load_csv") as st:
+        df = pd.read_csv(DATA_PATH)
+        st.rows = len(df)
     
     # --- PREPROCESSING ---
     print("2. Preprocessing Features...")
@@ -35,12 +44,14 @@ def train_delay_predictor():
         except:
             return 0
             
-    df['Arrival_Min'] = df['Scheduled_Arrival'].apply(time_to_minutes)
+    with profiler.stage("preprocess") as st:
+        df['Arrival_Min'] = df['Scheduled_Arrival'].apply(time_to_minutes)
     
-    # 2. Encode Categorical Data (Zone, Station)
-    # We save the encoders because we need them for the API later!
-    le_zone = LabelEncoder()
-    df['Zone_Encoded'] = le_zone.fit_transform(df['Zone'].astype(str))
+        # 2. Encode Categorical Data (Zone, Station)
+        # We save the encoders because we need them for the API later!
+        le_zone = LabelEncoder()
+        df['Zone_Encoded'] = le_zone.fit_transform(df['Zone'].astype(str))
+        st.rows = len(df)
     
     # We don't encode Station_Code for this simple model to avoid "High Cardinality" issues
     # (Too many unique stations makes the model slow for a student project).
@@ -60,11 +71,15 @@ def train_delay_predictor():
     print("3. Training Random Forest Model (this may take a moment)...")
     # n_estimators=100 means we use 100 decision trees
     model = RandomForestRegressor(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
+    with profiler.stage("train") as st:
+        model.fit(X_train, y_train)
+        st.rows = len(X_train)
     
     # --- EVALUATION ---
     print("4. Evaluating Model...")
-    predictions = model.predict(X_test)
+    with profiler.stage("predict_test") as st:
+        predictions = model.predict(X_test)
+        st.rows = len(X_test)
     mae = mean_absolute_error(y_test, predictions)
     r2 = r2_score(y_test, predictions)
     
@@ -75,13 +90,17 @@ def train_delay_predictor():
     
     # --- SAVING ---
     print("5. Saving Artifacts...")
-    joblib.dump(model, f"{MODEL_DIR}/delay_model.pkl")
-    joblib.dump(le_zone, f"{MODEL_DIR}/zone_encoder.pkl")
+    with profiler.stage("save_model"):
+        joblib.dump(model, f"{MODEL_DIR}/delay_model.pkl")
+        joblib.dump(le_zone, f"{MODEL_DIR}/zone_encoder.pkl")
     print(f"   ✅ Model saved to {MODEL_DIR}/delay_model.pkl")
 
     feature_names = ['Distance', 'Is_Weekend', 'Month', 'Arrival_Min', 'Zone']
     importances = model.feature_importances_
 
+    # Written before plt.show(), which blocks until the window is closed
+    profiler.report()
+
     plt.barh(feature_names, importances)
     plt.title("What causes delays?")
     plt.show()
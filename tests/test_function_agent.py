@@ -0,0 +1,49 @@
+import os
+import sys
+
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.tools import Tool
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.function_agent import FunctionCallingAgent, LLM_CALL_COUNTER
+
+
+class FakeLLM(FakeMessagesListChatModel):
+    """Returns the scripted messages in order; bind_tools is a no-op."""
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+PLAN = AIMessage(content="", tool_calls=[
+    {"name": "train_schedule_db", "args": {"query": "delhi"}, "id": "1"},
+    {"name": "railway_rules", "args": {"query": "tatkal"}, "id": "2"},
+])
+
+TOOLS = [
+    Tool(name="Train Schedule DB", func=lambda q: f"trains from {q}", description="schedules"),
+    Tool(name="Railway Rules", func=lambda q: f"rules on {q}", description="rules"),
+]
+
+
+def make_agent(max_llm_calls):
+    llm = FakeLLM(responses=[PLAN, AIMessage(content="synthesised answer")], callbacks=[LLM_CALL_COUNTER])
+    return FunctionCallingAgent(llm, TOOLS, max_llm_calls=max_llm_calls)
+
+
+def test_cap_reached_returns_tool_results_instead_of_failing():
+    result = make_agent(max_llm_calls=1).invoke("Trains from Delhi and tatkal rules?")
+
+    assert result["llm_calls"] == 1
+    assert result["tool_calls"] == ["train_schedule_db", "railway_rules"]
+    assert "Train Schedule DB: trains from delhi" in result["output"]
+    assert "Railway Rules: rules on tatkal" in result["output"]
+    assert "synthesised answer" not in result["output"]
+
+
+def test_within_cap_synthesises_once():
+    result = make_agent(max_llm_calls=2).invoke("Trains from Delhi and tatkal rules?")
+
+    assert result["llm_calls"] == 2
+    assert result["output"] == "synthesised answer"